@@ -1,12 +1,22 @@
 # blizzard_api.py
 import aiohttp
+import asyncio
 import os
 import json
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import quote
+from metrics import BLIZZARD_REQUEST_SECONDS, BLIZZARD_REQUEST_ERRORS
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 # Get Blizzard API credentials from environment variables
 CLIENT_ID = os.getenv('BLIZZARD_CLIENT_ID')
 CLIENT_SECRET = os.getenv('BLIZZARD_CLIENT_SECRET')
@@ -26,24 +36,307 @@ CURRENT_DUNGEONS = sorted([
     "Operation: Mechagon: Workshop"
 ])
 
-async def get_access_token():
-    url = "https://oauth.battle.net/token"
-    data = {"grant_type": "client_credentials"}
+OAUTH_URL = "https://oauth.battle.net/token"
+
+class BlizzardClient:
+    """Blizzard API client owned by the bot for its whole lifetime.
+
+    Holds one pooled HTTP session and caches the OAuth token until shortly before it
+    expires. A background task refreshes the token ahead of time, and concurrent callers
+    that find it expired share a single in-flight refresh.
+    """
+
+    def __init__(self, client_id=CLIENT_ID, client_secret=CLIENT_SECRET, region="us",
+                 oauth_url=OAUTH_URL, api_url=None, refresh_margin=300):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.region = region
+        self.oauth_url = oauth_url
+        self.api_url = api_url or f"https://{region}.api.blizzard.com"
+        self.refresh_margin = refresh_margin  # Seconds before expiry to treat the token as stale
+        self._session = None
+        self._token = None
+        self._expires_at = 0.0
+        self._inflight = None  # Shared token request while a refresh is running
+        self._refresher = None
+
+    async def start(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _token_valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    async def get_access_token(self) -> str:
+        if self._token_valid():
+            return self._token
+        return await self._refresh()
+
+    async def _refresh(self) -> str:
+        # Single-flight: everyone who needs a token while one is being minted awaits the same request
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._fetch_token())
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, task):
+        if self._inflight is task:
+            self._inflight = None
+
+    async def _fetch_token(self) -> str:
+        data = {"grant_type": "client_credentials"}
+        auth = aiohttp.BasicAuth(self.client_id, self.client_secret)
+        try:
+            with BLIZZARD_REQUEST_SECONDS.time("oauth/token"):
+                async with self._session.post(self.oauth_url, data=data, auth=auth) as resp:
+                    resp.raise_for_status()
+                    result = await resp.json()
+        except Exception:
+            BLIZZARD_REQUEST_ERRORS.inc("oauth/token")
+            raise
+        self._token = result["access_token"]
+        self._expires_at = time.monotonic() + result.get("expires_in", 86400)
+        return self._token
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, data=data, auth=aiohttp.BasicAuth(CLIENT_ID, CLIENT_SECRET)) as resp:
-            result = await resp.json()
-            return result["access_token"]
+    async def _refresh_loop(self):
+        while True:
+            try:
+                if not self._token_valid():
+                    await self._refresh()
+                # Wake up just before the token goes stale
+                delay = self._expires_at - self.refresh_margin - time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Error refreshing Blizzard token")
+                delay = 30
+            await asyncio.sleep(max(delay, 1))
 
-async def get_current_dungeons():
-    try:
-        token = await get_access_token()
+    async def get_json(self, path: str, params: dict = None, validators: dict = None, endpoint: str = None):
+        """GET a Game Data or Profile API resource, revalidating with the given ETag/Last-Modified.
+
+        Returns (data, validators). data is None when the server answered 304 Not Modified.
+        endpoint is the metric label; by default numeric IDs in the path are collapsed.
+        """
+        token = await self.get_access_token()
         headers = {"Authorization": f"Bearer {token}"}
-        
-        print(f"📜 Current dungeon pool: {json.dumps(CURRENT_DUNGEONS, indent=2)}")
-        return CURRENT_DUNGEONS
-
-    except Exception as e:
-        print(f"❌ Error fetching dungeons: {e}")
-        # Return pre-sorted list as fallback
-        return CURRENT_DUNGEONS
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        endpoint = endpoint or re.sub(r"/\d+", "/{id}", path)  # Keep realm and season IDs out of the metric labels
+        try:
+            with BLIZZARD_REQUEST_SECONDS.time(endpoint):
+                async with self._session.get(self.api_url + path, params=params, headers=headers) as resp:
+                    if resp.status == 304:
+                        return None, validators
+                    resp.raise_for_status()
+                    data = await resp.json()
+                    return data, {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        except Exception:
+            BLIZZARD_REQUEST_ERRORS.inc(endpoint)
+            raise
+
+
+REALM_SLUG = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def realm_slug(realm: str) -> str:
+    """Turn a realm name like "Area 52", "Quel'Thalas" or "Aggra (Português)" into its API slug.
+
+    Returns "" for anything that can't be a realm, so user input never reaches the API path.
+    """
+    folded = unicodedata.normalize("NFKD", realm).encode("ascii", "ignore").decode()
+    slug = re.sub(r"\s+", "-", re.sub(r"['()]", "", folded.strip().lower()))
+    return slug if REALM_SLUG.fullmatch(slug) else ""
+
+
+def character_key(name: str) -> str:
+    """The lowercase character name the profile API expects, or "" if it isn't one (letters only)."""
+    name = name.strip().lower()
+    return name if name.isalpha() else ""
+
+
+class CharacterProfiles:
+    """Mythic+ ratings for linked characters, cached with a TTL and LRU eviction.
+
+    Lookups for the same character share one in-flight request, so ten groups showing
+    the same player cost a single API call. Characters without a Mythic+ profile are
+    cached for a shorter time so a first run shows up soon after.
+    """
+
+    PATH = "/profile/wow/character/{realm}/{name}/mythic-keystone-profile"
+
+    def __init__(self, client: BlizzardClient = None, ttl: float = 900, missing_ttl: float = 120, max_size: int = 5000):
+        self.client = client
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.max_size = max_size
+        self._cache = OrderedDict()  # (realm, name) -> (expires_at, profile)
+        self._inflight = {}  # (realm, name) -> Task
+
+    def peek(self, realm: str, name: str):
+        """The cached profile, or None if it is missing or expired. Never touches the network."""
+        key = (realm, name)
+        entry = self._cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    async def get(self, realm: str, name: str):
+        cached = self.peek(realm, name)
+        if cached is not None:
+            return cached
+        key = (realm, name)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._fetch(key))
+            task.add_done_callback(lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is done else None)
+        return await asyncio.shield(task)
+
+    async def get_many(self, characters) -> list:
+        """Look up several characters concurrently. Failed lookups come back as None."""
+        results = await asyncio.gather(*(self.get(realm, name) for realm, name in characters), return_exceptions=True)
+        return [None if isinstance(result, Exception) else result for result in results]
+
+    async def _fetch(self, key):
+        realm, name = key
+        params = {"namespace": f"profile-{self.client.region}", "locale": "en_US"}
+        try:
+            # Encoded so even a stored link from before validation can't step outside the profile path
+            path = self.PATH.format(realm=quote(realm, safe=""), name=quote(name, safe=""))
+            data, _ = await self.client.get_json(path, params, endpoint=self.PATH)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 404:
+                raise
+            # No Mythic+ runs this season, or no such character
+            profile = {"name": name.capitalize(), "realm": realm.replace("-", " ").title(), "rating": None}
+            ttl = self.missing_ttl
+        else:
+            character = data.get("character") or {}
+            profile = {
+                "name": character.get("name", name.capitalize()),
+                "realm": (character.get("realm") or {}).get("name", realm),
+                "rating": (data.get("current_mythic_rating") or {}).get("rating"),
+            }
+            ttl = self.ttl
+
+        self._cache[key] = (time.monotonic() + ttl, profile)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return profile
+
+
+class DungeonPool:
+    """Current season dungeon list, cached on disk and revalidated in the background.
+
+    The cached list is read synchronously at startup so nothing waits on the network.
+    A background task then revalidates each API resource with conditional requests, so
+    an unchanged season costs two 304s, and calls on_change with the new sorted list
+    whenever it differs from what we had.
+    """
+
+    def __init__(self, client: BlizzardClient, path: str, on_change=None, interval: float = 6 * 3600,
+                 connected_realm_id: int = 11):
+        self.client = client
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.connected_realm_id = connected_realm_id  # The leaderboard index lists the current rotation
+        self.dungeons = list(CURRENT_DUNGEONS)
+        self._cache = {"season_id": None, "dungeons": None, "validators": {}}
+        self._task = None
+
+    def load_cached(self) -> list:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return self.dungeons
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable dungeon cache: %s", e, extra={"path": self.path})
+            return self.dungeons
+        self._cache.update(cache)
+        if self._cache["dungeons"]:
+            self.dungeons = sorted(self._cache["dungeons"])
+        return self.dungeons
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self) -> bool:
+        """Revalidate the season and leaderboard resources. Returns True if the pool changed."""
+        namespace = {"namespace": f"dynamic-{self.client.region}", "locale": "en_US"}
+        validators = self._cache["validators"]
+        changed = False
+        modified = False
+
+        season_path = "/data/wow/mythic-keystone/season/index"
+        data, validators[season_path] = await self.client.get_json(season_path, namespace, validators.get(season_path))
+        if data is not None:
+            modified = True
+            self._cache["season_id"] = data["current_season"]["id"]
+
+        dungeon_path = f"/data/wow/connected-realm/{self.connected_realm_id}/mythic-leaderboard/index"
+        data, validators[dungeon_path] = await self.client.get_json(dungeon_path, namespace, validators.get(dungeon_path))
+        if data is not None:
+            modified = True
+            dungeons = sorted({leaderboard["name"] for leaderboard in data["current_leaderboards"]})
+            if dungeons and dungeons != self.dungeons:
+                self._cache["dungeons"] = dungeons
+                self.dungeons = dungeons
+                changed = True
+
+        if modified:
+            await asyncio.to_thread(self._save)
+        if changed and self.on_change is not None:
+            self.on_change(self.dungeons)
+        return changed
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.refresh():
+                    log.info("Dungeon pool updated", extra={"season_id": self._cache["season_id"], "dungeons": len(self.dungeons)})
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Error fetching dungeons")
+            await asyncio.sleep(self.interval)
+
+    def _save(self):
+        # Write to a temp file first so a crash never leaves a half-written cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f)
+        os.replace(tmp_path, self.path)
@@ -1,62 +1,164 @@
 import discord
 from discord.ext import commands
-from handlers import DungeonCommands, GroupView
+from blizzard_api import BlizzardClient
+from state import active_groups, character_links, group_history, group_store, match_posts, ping_digest, timers
+import metrics
+from command_sync import sync_if_changed
+from log_setup import setup_logging
+from rest_scheduler import outbound
+import argparse
+import asyncio
+import logging
 import os
-import traceback
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# JSON logs written by a background thread, so a slow stdout never stalls the event loop
+log_listener = setup_logging(os.getenv('LOG_LEVEL', 'INFO'))
+log = logging.getLogger("bot")
+
+parser = argparse.ArgumentParser(description="WoW M+ group finder bot")
+parser.add_argument("--force-sync", action="store_true", help="Sync slash commands even if they have not changed")
+args = parser.parse_args()
+
 # Get configuration from environment variables
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
-GUILD_ID = int(os.getenv('GUILD_ID'))  # Convert to int since env vars are strings
+GUILD_ID = int(os.getenv('GUILD_ID')) if os.getenv('GUILD_ID') else None  # Dev guild; unset to sync commands globally
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # 0 turns the /metrics endpoint off
+SHARDED = os.getenv('SHARDED', '').lower() in ('1', 'true', 'yes')
 
-if not DISCORD_TOKEN or not GUILD_ID:
+if not DISCORD_TOKEN:
     raise ValueError("Missing required environment variables. Please check your .env file.")
 
-# Set up required intents
+# Set up required intents. The members intent makes Discord stream every member of every
+# guild on connect; nothing here needs it, since interactions carry the member who clicked.
 intents = discord.Intents.default()
 intents.message_content = True
-intents.members = True
+intents.members = os.getenv('MEMBERS_INTENT', '').lower() in ('1', 'true', 'yes')
 
-class MyBot(commands.Bot):
+# One gateway connection per shard once the bot is in enough guilds to need them
+BotBase = commands.AutoShardedBot if SHARDED else commands.Bot
+
+class MyBot(BotBase):
     def __init__(self):
-        super().__init__(command_prefix="!", intents=intents)
+        super().__init__(command_prefix="!", intents=intents, chunk_guilds_at_startup=False)
+        self.blizzard = BlizzardClient()  # One pooled session and cached token for the bot's lifetime
+        self.metrics_runner = None
         
     async def setup_hook(self):
         try:
-            print("Adding cogs...")
-            await self.add_cog(DungeonCommands(self, GUILD_ID))
+            # Restore groups that were open before the last restart
+            group_store.open(default_guild_id=GUILD_ID)  # Groups saved before multi-guild support belong to the old guild
+            active_groups.restore(group_store.load_all())
+            character_links.update(group_store.load_characters())
+            group_store.start()
+            # Load the /stats aggregates from their snapshot and replay whatever was appended after it
+            group_history.open()
+            group_history.start()
+            log.info("Restored %d active groups", len(active_groups), extra={"groups": len(active_groups)})
+
+            await self.blizzard.start()
+
+            # Latency histograms and REST/rate-limit counters on a local /metrics endpoint
+            metrics.install_discord_hooks()
+            if METRICS_PORT:
+                self.metrics_runner = await metrics.serve(os.getenv('METRICS_HOST', '127.0.0.1'), METRICS_PORT)
+                log.info("Metrics available on port %d", METRICS_PORT)
+
+            # The group commands and buttons are an extension, so /reload can swap them without a restart
+            log.info("Loading extensions")
+            await self.load_extension("handlers")
             
             # Basic test command
-            @self.tree.command(description="Test if the bot is working", guild=discord.Object(id=GUILD_ID))
+            @self.tree.command(description="Test if the bot is working")
+            @metrics.instrumented("ping")
             async def ping(interaction: discord.Interaction):
                 await interaction.response.send_message("Pong! 🏓")
+
+            @self.tree.command(description="Reload the group commands and buttons in place (bot owner only)")
+            @discord.app_commands.default_permissions(administrator=True)
+            @metrics.instrumented("reload")
+            async def reload(interaction: discord.Interaction):
+                await self.reload_handlers(interaction)
             
-            # Add persistent view for buttons
-            self.add_view(GroupView(None))
-            
-            # Register commands for the specific guild
-            print("Syncing commands...")
-            guild = discord.Object(id=GUILD_ID)
-            self.tree.copy_global_to(guild=guild)
-            await self.tree.sync(guild=guild)
-            print("Commands synced successfully!")
-        except Exception as e:
-            print(f"Error during setup: {e}")
-            traceback.print_exc()
+            if await self.sync_commands(force=args.force_sync):
+                log.info("Commands synced")
+            else:
+                log.info("Commands unchanged, skipping sync")
+        except Exception:
+            log.exception("Error during setup")
+
+    async def sync_commands(self, force: bool = False) -> bool:
+        # Register commands for the dev guild (instant) or globally, skipping the sync if nothing changed since the last one
+        guild = discord.Object(id=GUILD_ID) if GUILD_ID else None
+        if guild:
+            self.tree.copy_global_to(guild=guild)  # Again after a reload, or the guild copies keep the old cog
+        sync_path = os.getenv('COMMAND_SYNC_STATE_PATH', '.command_sync.json')
+        return await sync_if_changed(self.tree, self.application_id, guild, sync_path, force=force)
+
+    async def reload_handlers(self, interaction: discord.Interaction):
+        # The bot runs in many servers, so a server administrator alone can't reload it for everyone
+        if not await self.is_owner(interaction.user):
+            await interaction.response.send_message("❌ Only the bot owner can reload the bot.", ephemeral=True)
+            return
+
+        # Answer within Discord's 3 seconds whatever the unload has to wait for
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        start = time.perf_counter()
+        try:
+            # Groups, queues and timers live in state.py, so only the code is swapped
+            await self.reload_extension("handlers")
+        except commands.ExtensionError as e:
+            log.exception("Reload failed")
+            await interaction.followup.send(f"❌ Reload failed, still running the previous version: {e}", ephemeral=True)
+            return
+        elapsed = time.perf_counter() - start
+        log.info("Reloaded handlers", extra={"seconds": round(elapsed, 6), "groups": len(active_groups)})
+        await interaction.followup.send(
+            f"♻️ Reloaded in {elapsed * 1000:.0f} ms, {len(active_groups)} open groups kept.", ephemeral=True
+        )
+
+        # Only changed command signatures need a sync
+        if await self.sync_commands():
+            await interaction.followup.send("Command changes synced.", ephemeral=True)
+
+    async def drain_outbound(self):
+        # Matched groups still being announced queue calls of their own, so they go first
+        if match_posts:
+            await asyncio.wait(set(match_posts))
+        await outbound.drain()
+
+    async def close(self):
+        # Stop taking clicks and firing timers, send queued announcements and edits, then flush pending group and history writes
+        if "handlers" in self.extensions:
+            await self.unload_extension("handlers")  # Stops the matcher and dungeon pool
+        await timers.close()
+        await ping_digest.close()
+        try:
+            await asyncio.wait_for(self.drain_outbound(), timeout=5)
+        except asyncio.TimeoutError:
+            log.warning("Shutting down with Discord calls still queued")
+        await group_store.close()
+        await group_history.close()
+        await self.blizzard.close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await super().close()
 
 bot = MyBot()
 
 @bot.event
 async def on_ready():
-    print(f"✅ Logged in as {bot.user}!")
-    guild = bot.get_guild(GUILD_ID)
-    if guild:
-        print(f"Connected to guild: {guild.name}")
-    print(f"Bot is in {len(bot.guilds)} guilds")
-    print(f"Command list: {[cmd.name for cmd in bot.tree.get_commands()]}")
+    log.info("Logged in as %s", bot.user, extra={
+        "guilds": len(bot.guilds),
+        "shards": bot.shard_count or 1,
+        "commands": [cmd.name for cmd in bot.tree.get_commands()],
+    })
+    for guild in bot.guilds:
+        log.debug("Connected to guild %s", guild.name, extra={"guild_id": guild.id})
 
 @bot.tree.error
 async def on_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
@@ -64,7 +166,9 @@ async def on_command_error(interaction: discord.Interaction, error: discord.app_
         await interaction.response.send_message("❌ Command not found.", ephemeral=True)
     else:
         await interaction.response.send_message(f"❌ Error: {str(error)}", ephemeral=True)
-        print(f"Command error: {error}")
-        traceback.print_exc()
+        log.error("Command error: %s", error, exc_info=error, extra={"correlation_id": interaction.id})
 
-bot.run(DISCORD_TOKEN)
+try:
+    bot.run(DISCORD_TOKEN, log_handler=None)  # discord.py logs through the queue set up above
+finally:
+    log_listener.stop()
@@ -0,0 +1,56 @@
+# command_sync.py
+import hashlib
+import json
+import os
+
+
+def _command_payload(command, tree) -> dict:
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        return command.to_dict()  # discord.py < 2.4 takes no tree argument
+
+
+def tree_signature(tree, guild=None) -> str:
+    """Stable hash of everything Discord sees for these commands: names, options, ranges, choices."""
+    payload = sorted((_command_payload(command, tree) for command in tree.get_commands(guild=guild)),
+                     key=lambda command: (command.get("type", 1), command["name"]))
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SyncState:
+    """Remembers the signature of the last successful sync per application and guild."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.signatures = json.load(f)
+        except (OSError, ValueError):
+            self.signatures = {}
+
+    @staticmethod
+    def _key(application_id, guild) -> str:
+        return f"{application_id}:{guild.id if guild else 'global'}"
+
+    def is_current(self, application_id, guild, signature: str) -> bool:
+        return self.signatures.get(self._key(application_id, guild)) == signature
+
+    def mark_synced(self, application_id, guild, signature: str):
+        self.signatures[self._key(application_id, guild)] = signature
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.signatures, f)
+        os.replace(tmp_path, self.path)
+
+
+async def sync_if_changed(tree, application_id, guild=None, path: str = ".command_sync.json", force: bool = False) -> bool:
+    """Sync the command tree only when its signature differs from the last sync. Returns True if it synced."""
+    state = SyncState(path)
+    signature = tree_signature(tree, guild)
+    if not force and state.is_current(application_id, guild, signature):
+        return False
+    await tree.sync(guild=guild)
+    state.mark_synced(application_id, guild, signature)
+    return True
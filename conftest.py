@@ -0,0 +1,6 @@
+# conftest.py
+# Lets the tests import the bot's top-level modules; blizzard_api needs credentials at import time
+import os
+
+os.environ.setdefault("BLIZZARD_CLIENT_ID", "test")
+os.environ.setdefault("BLIZZARD_CLIENT_SECRET", "test")
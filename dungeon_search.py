@@ -0,0 +1,185 @@
+# dungeon_search.py
+import re
+from collections import OrderedDict
+
+# Names the community actually types, mapped to the dungeon they mean.
+# Aliases for dungeons that are not in the current pool are ignored.
+COMMUNITY_ALIASES = {
+    "ml": "The MOTHERLODE!!",
+    "lode": "The MOTHERLODE!!",
+    "fg": "Operation: Floodgate",
+    "flood": "Operation: Floodgate",
+    "brew": "Cinderbrew Meadery",
+    "cbm": "Cinderbrew Meadery",
+    "dfc": "Darkflame Cleft",
+    "rook": "The Rookery",
+    "psf": "Priory of the Sacred Flame",
+    "top": "Theater of Pain",
+    "work": "Operation: Mechagon: Workshop",
+    "mech": "Operation: Mechagon: Workshop",
+    "ara": "Ara-Kara, City of Echoes",
+    "ak": "Ara-Kara, City of Echoes",
+    "cot": "City of Threads",
+    "sv": "The Stonevault",
+    "dawn": "The Dawnbreaker",
+    "gb": "Grim Batol",
+    "nw": "The Necrotic Wake",
+    "mots": "Mists of Tirna Scithe",
+    "mists": "Mists of Tirna Scithe",
+    "sob": "Siege of Boralus",
+    "siege": "Siege of Boralus",
+    "hoa": "Halls of Atonement",
+    "eda": "Eco-Dome Al'dani",
+    "gambit": "Tazavesh: So'leah's Gambit",
+    "streets": "Tazavesh: Streets of Wonder",
+}
+
+STOP_WORDS = {"the", "of"}
+
+# Match scores, best first
+ALIAS, ACRONYM, PREFIX, WORD_PREFIX, SUBSTRING, ACRONYM_PREFIX, FUZZY = 100, 90, 80, 70, 60, 50, 40
+MIN_SIMILARITY = 0.35
+MAX_PREFIX = 24  # Longer queries fall back to a scan for whole-name prefixes
+EMPTY = frozenset()
+
+
+def normalize(text: str) -> str:
+    """Lowercase and reduce punctuation to single spaces: "The MOTHERLODE!!" -> "the motherlode"."""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def trigrams(text: str) -> set:
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class DungeonIndex:
+    """Search index over a dungeon pool, built once each time the pool changes.
+
+    Matches aliases, acronyms, prefixes and substrings, and falls back to trigram
+    similarity so typos like "rokery" still find "The Rookery". Results for recent
+    queries are kept in a small LRU since autocomplete fires on every keypress.
+    """
+
+    def __init__(self, names, aliases=COMMUNITY_ALIASES, cache_size: int = 512):
+        self.names = tuple(names)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._normalized = [normalize(name) for name in self.names]
+        self._trigram_counts = []
+        # Every lookup structure maps a key to the indexes of the names it matches
+        self._name_prefixes = {}
+        self._word_prefixes = {}
+        self._acronyms = {}
+        self._acronym_prefixes = {}
+        self._postings = {}  # trigram -> names containing it
+
+        for i, name in enumerate(self._normalized):
+            words = name.split()
+            for end in range(1, min(len(name), MAX_PREFIX) + 1):
+                self._name_prefixes.setdefault(name[:end], []).append(i)
+            for word in words:
+                for end in range(1, len(word) + 1):
+                    self._word_prefixes.setdefault(word[:end], set()).add(i)
+            for acronym in self._acronyms_for(words):
+                self._acronyms.setdefault(acronym, set()).add(i)
+                for end in range(1, len(acronym) + 1):
+                    self._acronym_prefixes.setdefault(acronym[:end], set()).add(i)
+            grams = trigrams(name)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+        positions = {name: i for i, name in enumerate(self.names)}
+        self._aliases = {
+            normalize(alias): positions[name]
+            for alias, name in aliases.items() if name in positions
+        }
+
+    @staticmethod
+    def _acronyms_for(words) -> set:
+        acronyms = {"".join(word[0] for word in words)}
+        significant = [word for word in words if word not in STOP_WORDS]
+        if significant:
+            acronyms.add("".join(word[0] for word in significant))
+        return acronyms
+
+    def search(self, query: str, limit: int = 25) -> list:
+        """Return up to limit dungeon names, best match first."""
+        key = normalize(query)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached[:limit]
+
+        if not key:
+            results = list(self.names)
+        else:
+            results = self._rank(key)
+
+        self._cache[key] = results
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results[:limit]
+
+    def resolve(self, query: str):
+        """The one dungeon a typed name unambiguously means, or None.
+
+        Only alias, acronym and (word) prefix matches count. A typo-tolerant trigram match is
+        a suggestion, not an answer, so a name that is not in the pool never turns into
+        another dungeon.
+        """
+        key = normalize(query)
+        if not key:
+            return None
+        scores = self._scores(key)
+        best = max(scores.values(), default=0)
+        if best < WORD_PREFIX:
+            return None
+        matches = [i for i, score in scores.items() if score == best]
+        return self.names[matches[0]] if len(matches) == 1 else None
+
+    def _rank(self, query: str) -> list:
+        scores = self._scores(query)
+        ranked = sorted(scores, key=lambda i: (-scores[i], self.names[i]))
+        return [self.names[i] for i in ranked]
+
+    def _scores(self, query: str) -> dict:
+        """Best match score per name index."""
+        scores = {}
+        compact = query.replace(" ", "")
+
+        def add(indexes, score):
+            for i in indexes:
+                if score > scores.get(i, 0):
+                    scores[i] = score
+
+        alias = self._aliases.get(query)
+        if alias is not None:
+            add((alias,), ALIAS)
+        add(self._acronyms.get(compact, ()), ACRONYM)
+        if len(query) <= MAX_PREFIX:
+            add(self._name_prefixes.get(query, ()), PREFIX)
+        else:
+            add([i for i, name in enumerate(self._normalized) if name.startswith(query)], PREFIX)
+        word_matches = [self._word_prefixes.get(word, EMPTY) for word in query.split()]
+        add(word_matches[0].intersection(*word_matches[1:]), WORD_PREFIX)
+        add([i for i, name in enumerate(self._normalized) if query in name], SUBSTRING)
+        add(self._acronym_prefixes.get(compact, ()), ACRONYM_PREFIX)
+
+        # Typo tolerance: count shared trigrams through the postings lists
+        query_grams = trigrams(query)
+        shared = {}
+        for gram in query_grams:
+            for i in self._postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        for i, count in shared.items():
+            if i in scores:
+                continue
+            similarity = 2 * count / (len(query_grams) + self._trigram_counts[i])
+            if similarity >= MIN_SIMILARITY:
+                scores[i] = FUZZY * similarity
+        return scores
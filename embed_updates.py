@@ -0,0 +1,71 @@
+# embed_updates.py
+import asyncio
+import logging
+from rest_scheduler import DEFERRABLE, outbound
+
+log = logging.getLogger(__name__)
+
+
+class _Slot:
+    __slots__ = ("message", "render", "dirty", "task")
+
+    def __init__(self, message):
+        self.message = message
+        self.render = None
+        self.dirty = False
+        self.task = None
+
+
+class EmbedCoalescer:
+    """Folds bursts of group changes into at most one embed edit per message per window.
+
+    The first change to an idle message is shown through the interaction response itself
+    (claim() returns True). Any change that lands while that window is open only marks the
+    message dirty, and a single message.edit() with the latest render goes out when the
+    window closes. Rendering happens at flush time, so the final edit is never stale.
+    """
+
+    def __init__(self, window: float = 1.0):
+        self.window = window
+        self._slots = {}  # message ID -> _Slot
+
+    def claim(self, message) -> bool:
+        """Open a window for this message. True means the caller should update it directly."""
+        if message.id in self._slots:
+            return False
+        self._open(message)
+        return True
+
+    def schedule(self, message, render):
+        """Queue an edit with whatever render() returns when the window closes."""
+        slot = self._slots.get(message.id) or self._open(message)
+        slot.render = render
+        slot.dirty = True
+
+    def cancel(self, message_id):
+        """Drop any queued edit, e.g. because the message is being deleted."""
+        slot = self._slots.pop(message_id, None)
+        if slot is not None and slot.task is not None:
+            slot.task.cancel()
+
+    def _open(self, message) -> _Slot:
+        slot = self._slots[message.id] = _Slot(message)
+        slot.task = asyncio.create_task(self._run(message.id, slot))
+        return slot
+
+    async def _run(self, message_id, slot):
+        try:
+            while True:
+                await asyncio.sleep(self.window)
+                if not slot.dirty:
+                    break
+                slot.dirty = False
+                try:
+                    embed = slot.render()
+                    await outbound.call(DEFERRABLE, ("channel", slot.message.channel.id),
+                                        lambda: slot.message.edit(embed=embed), merge_key=("edit", message_id))
+                except Exception:
+                    log.exception("Error updating group message", extra={"message_id": message_id})
+        finally:
+            if self._slots.get(message_id) is slot:
+                del self._slots[message_id]
@@ -0,0 +1,314 @@
+# group_history.py
+"""Append-only history of closed groups, with running per-guild aggregates for /stats.
+
+Every completed, cancelled or expired group becomes one fixed-width record in the
+history file. The aggregates are updated in memory as records are written and are
+snapshotted to disk together with the history offset they cover, so startup only
+replays whatever was appended after the last snapshot.
+
+    python group_history.py rebuild
+    python group_history.py compact --keep-days 180
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"MPH1"
+# guild ID, message ID, created at, closed at, key level, outcome, missing roles, last role, dungeon
+RECORD = struct.Struct("<QQddBBBB40s")
+OUTCOMES = ("completed", "cancelled", "expired")
+ROLES = ("tank", "healer", "dps")
+MISSING_BITS = {"tank": 1, "healer": 2, "dps": 4}
+NO_ROLE = 255
+
+
+def pack(group, outcome: str, closed_at: float = None, last_role: str = None) -> bytes:
+    missing = 0
+    if group.tank is None:
+        missing |= MISSING_BITS["tank"]
+    if group.healer is None:
+        missing |= MISSING_BITS["healer"]
+    if len(group.dps) < 3:
+        missing |= MISSING_BITS["dps"]
+    return RECORD.pack(
+        group.guild_id or 0,
+        group.message_id or 0,
+        group.created_at.timestamp(),
+        time.time() if closed_at is None else closed_at,
+        max(0, min(255, group.key_level)),
+        OUTCOMES.index(outcome),
+        missing,
+        ROLES.index(last_role) if last_role else NO_ROLE,
+        group.dungeon.encode("utf-8"),  # struct cuts it to 40 bytes
+    )
+
+
+def unpack(data: bytes) -> dict:
+    guild_id, message_id, created_at, closed_at, key_level, outcome, missing, last_role, dungeon = RECORD.unpack(data)
+    return {
+        "guild_id": guild_id,
+        "message_id": message_id,
+        "created_at": created_at,
+        "closed_at": closed_at,
+        "key_level": key_level,
+        "outcome": OUTCOMES[outcome],
+        "missing": [role for role in ROLES if missing & MISSING_BITS[role]],
+        "last_role": None if last_role == NO_ROLE else ROLES[last_role],
+        "dungeon": dungeon.rstrip(b"\0").decode("utf-8", "ignore"),
+    }
+
+
+def read_records(path: str, offset: int = 0):
+    """Yield (end offset, record) for every complete record from offset on. A torn last record is ignored."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a group history file")
+        f.seek(max(offset, len(MAGIC)))
+        while True:
+            data = f.read(RECORD.size)
+            if len(data) < RECORD.size:
+                return
+            yield f.tell(), unpack(data)
+
+
+class HistoryStats:
+    """Running totals per guild and dungeon. Adding a record and reading a summary never touch the history."""
+
+    def __init__(self, guilds: dict = None):
+        # guild ID -> {"dungeons": {name: [completed, cancelled, expired, key sum, fill seconds, fills]},
+        #              "needed": {role: count}}
+        self.guilds = guilds or {}
+
+    def add(self, record: dict):
+        guild = self.guilds.setdefault(str(record["guild_id"]), {"dungeons": {}, "needed": dict.fromkeys(ROLES, 0)})
+        totals = guild["dungeons"].setdefault(record["dungeon"], [0, 0, 0, 0, 0.0, 0])
+        totals[OUTCOMES.index(record["outcome"])] += 1
+        totals[3] += record["key_level"]
+        if record["outcome"] == "completed":
+            totals[4] += max(0.0, record["closed_at"] - record["created_at"])
+            totals[5] += 1
+            # The role that filled last is the one the group was waiting on
+            if record["last_role"]:
+                guild["needed"][record["last_role"]] += 1
+        else:
+            for role in record["missing"]:
+                guild["needed"][role] += 1
+
+    def summary(self, guild_id) -> dict:
+        guild = self.guilds.get(str(guild_id))
+        if guild is None:
+            return None
+        dungeons = {}
+        for name, (completed, cancelled, expired, key_sum, fill_seconds, fills) in guild["dungeons"].items():
+            total = completed + cancelled + expired
+            dungeons[name] = {
+                "total": total,
+                "completed": completed,
+                "cancelled": cancelled,
+                "expired": expired,
+                "average_key": key_sum / total if total else 0.0,
+                "average_fill_seconds": fill_seconds / fills if fills else None,
+            }
+        needed = guild["needed"]
+        return {
+            "dungeons": dungeons,
+            "most_needed_role": max(ROLES, key=needed.get) if any(needed.values()) else None,
+            "needed": dict(needed),
+        }
+
+    @classmethod
+    def rebuild(cls, path: str):
+        """Recompute the aggregates from the whole history. Returns (stats, offset)."""
+        stats = cls()
+        offset = len(MAGIC)
+        for offset, record in read_records(path):
+            stats.add(record)
+        return stats, offset
+
+
+class GroupHistory:
+    """Records closed groups. Appends are write-behind like GroupStore, so handlers never wait on disk."""
+
+    def __init__(self, path: str, snapshot_path: str = None, flush_interval: float = 1.0, snapshot_every: int = 100):
+        self.path = path
+        self.snapshot_path = snapshot_path or f"{path}.snapshot.json"
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every  # Records between snapshots
+        self.stats = HistoryStats()
+        self._offset = len(MAGIC)  # End of the last record written to disk
+        self._since_snapshot = 0
+        self._pending = []
+        self._wake = asyncio.Event()
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+    def open(self):
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(MAGIC)
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.stats = HistoryStats(snapshot["guilds"])
+            self._offset = snapshot["offset"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Ignoring unreadable history snapshot: %s", e)
+            self.stats, self._offset = HistoryStats(), len(MAGIC)
+
+        if self._offset > os.path.getsize(self.path):
+            log.warning("History snapshot is ahead of the history file; rebuilding it")
+            self.stats, self._offset = HistoryStats(), len(MAGIC)
+
+        # Catch up on records appended after the snapshot was taken
+        replayed = 0
+        for self._offset, record in read_records(self.path, self._offset):
+            self.stats.add(record)
+            replayed += 1
+        self._since_snapshot = replayed
+        # Cut off a torn record from a crash so new records stay aligned
+        if os.path.getsize(self.path) != self._offset:
+            with open(self.path, "r+b") as f:
+                f.truncate(self._offset)
+        log.info("Group history loaded", extra={"replayed": replayed, "offset": self._offset})
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def record(self, group, outcome: str, last_role: str = None):
+        """Count a closed group right away and queue its record for the next flush."""
+        data = pack(group, outcome, last_role=last_role)
+        self.stats.add(unpack(data))
+        self._pending.append(data)
+        self._wake.set()
+
+    def summary(self, guild_id) -> dict:
+        return self.stats.summary(guild_id)
+
+    async def flush(self, snapshot: bool = False):
+        async with self._flush_lock:
+            if not self._pending and not snapshot:
+                return
+            batch, self._pending = b"".join(self._pending), []
+            self._since_snapshot += len(batch) // RECORD.size
+            # The aggregates already include every record in this batch, so they describe the file after it
+            state = None
+            if snapshot or self._since_snapshot >= self.snapshot_every:
+                state = json.dumps({"offset": self._offset + len(batch), "guilds": self.stats.guilds})
+            try:
+                await asyncio.to_thread(self._write, batch, state)
+            except Exception:
+                log.exception("Error writing group history")
+                self._pending.insert(0, batch)
+                self._since_snapshot -= len(batch) // RECORD.size
+                return
+            self._offset += len(batch)
+            if state is not None:
+                self._since_snapshot = 0
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(snapshot=True)
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._wake.clear()
+            await self.flush()
+
+    def _write(self, batch: bytes, state: str):
+        # Append first: a snapshot must never point past the end of the history
+        if batch:
+            with open(self.path, "ab") as f:
+                f.write(batch)
+                f.flush()
+                os.fsync(f.fileno())
+        if state is not None:
+            write_snapshot(self.snapshot_path, state)
+
+
+def write_snapshot(path: str, state: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(state)
+    os.replace(tmp_path, path)
+
+
+def compact(path: str, keep_days: float = None) -> tuple:
+    """Rewrite the history without torn or duplicate records, and optionally without old ones.
+
+    Returns (records kept, records dropped).
+    """
+    cutoff = time.time() - keep_days * 86400 if keep_days else None
+    kept = {}
+    total = 0
+    for _, record in read_records(path):
+        total += 1
+        if cutoff is not None and record["closed_at"] < cutoff:
+            continue
+        # A group closes once; if it was written twice, keep the first
+        kept.setdefault((record["guild_id"], record["message_id"], record["created_at"]), record)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        for record in sorted(kept.values(), key=lambda r: r["closed_at"]):
+            f.write(RECORD.pack(
+                record["guild_id"], record["message_id"], record["created_at"], record["closed_at"],
+                record["key_level"], OUTCOMES.index(record["outcome"]),
+                sum(MISSING_BITS[role] for role in record["missing"]),
+                ROLES.index(record["last_role"]) if record["last_role"] else NO_ROLE,
+                record["dungeon"].encode("utf-8"),
+            ))
+    os.replace(tmp_path, path)
+    return len(kept), total - len(kept)
+
+
+def rebuild_snapshot(path: str, snapshot_path: str = None) -> HistoryStats:
+    stats, offset = HistoryStats.rebuild(path)
+    write_snapshot(snapshot_path or f"{path}.snapshot.json", json.dumps({"offset": offset, "guilds": stats.guilds}))
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline maintenance for the group history file (stop the bot first)")
+    parser.add_argument("command", choices=["rebuild", "compact", "show"])
+    parser.add_argument("--path", default=os.getenv("GROUP_HISTORY_PATH", "group_history.bin"))
+    parser.add_argument("--keep-days", type=float, default=None, help="compact: drop groups closed more than this many days ago")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        print(f"{args.path} does not exist", file=sys.stderr)
+        return 1
+
+    if args.command == "compact":
+        kept, dropped = compact(args.path, args.keep_days)
+        print(f"Kept {kept} records, dropped {dropped}")
+    if args.command in ("compact", "rebuild"):
+        stats = rebuild_snapshot(args.path)
+        print(f"Snapshot rebuilt for {len(stats.guilds)} guilds")
+    if args.command == "show":
+        for _, record in read_records(args.path):
+            closed = datetime.fromtimestamp(record["closed_at"]).strftime("%Y-%m-%d %H:%M")
+            print(f"{closed}  {record['guild_id']:>20}  {record['outcome']:<9}  +{record['key_level']:<3} {record['dungeon']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# group_registry.py
+import asyncio
+from datetime import datetime
+
+
+class Group:
+    """A single M+ group. Players are stored by user ID, display names are kept separately for rendering.
+
+    Once registered, a group's names point at its guild's shared table rather than a copy of
+    their own, and the lock and profiles are only created when first needed.
+    """
+    __slots__ = (
+        "message_id", "channel_id", "guild_id", "dungeon", "key_level", "start_time", "created_at",
+        "creator", "tank", "healer", "dps", "players", "names", "profiles", "_lock",
+        "version", "render_cache",
+    )
+
+    def __init__(self, dungeon: str, key_level: int, creator: int, start_time: datetime,
+                 message_id: int = None, channel_id: int = None, guild_id: int = None, created_at: datetime = None):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.dungeon = dungeon
+        self.key_level = key_level
+        self.start_time = start_time
+        self.created_at = created_at or datetime.now()  # For fill times in the group history
+        self.creator = creator
+        self.tank = None
+        self.healer = None
+        self.dps = []
+        self.players = set()
+        self.names = {}  # user ID -> display name; the registry's shared table once the group is registered
+        self.profiles = None  # user ID -> linked character summary, filled in after the fact
+        self._lock = None
+        self.version = 0  # Bumped on every roster change
+        self.render_cache = None  # (key, embed) from GroupRenderer
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Serializes changes to this group only."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def name(self, user_id: int) -> str:
+        return self.names.get(user_id, f"<@{user_id}>")
+
+    def display_names(self) -> dict:
+        """This group's own entries from the name table: its players and creator."""
+        return {user_id: self.names[user_id] for user_id in (self.creator, *self.players) if user_id in self.names}
+
+    def profile(self, user_id: int):
+        return self.profiles.get(user_id) if self.profiles else None
+
+    def set_profile(self, user_id: int, summary: str):
+        """Show a character summary next to a player. Not persisted; it is looked up again after a restart."""
+        if self.profile(user_id) != summary:
+            if self.profiles is None:
+                self.profiles = {}
+            self.profiles[user_id] = summary
+            self.version += 1
+
+    def role_of(self, user_id: int):
+        if self.tank == user_id:
+            return "tank"
+        if self.healer == user_id:
+            return "healer"
+        if user_id in self.dps:
+            return "dps"
+        return None
+
+    def is_full(self) -> bool:
+        return self.tank is not None and self.healer is not None and len(self.dps) == 3
+
+
+class GroupRegistry:
+    """Active groups indexed by message, channel, creator and member so every lookup is O(1)."""
+
+    def __init__(self, store=None):
+        self.store = store  # Optional GroupStore that mirrors every change to disk
+        self._by_message = {}  # message ID -> Group
+        self._by_channel = {}  # channel ID -> {message ID: Group}, in creation order
+        self._by_creator = {}  # user ID -> {message ID: Group}
+        self._by_member = {}   # user ID -> {message ID: Group}
+        self.names = {}  # user ID -> display name, shared by every registered group in the guild
+
+    def __len__(self):
+        return len(self._by_message)
+
+    def __iter__(self):
+        return iter(list(self._by_message.values()))
+
+    def __contains__(self, message_id):
+        return message_id in self._by_message
+
+    def get(self, message_id):
+        return self._by_message.get(message_id)
+
+    def in_channel(self, channel_id) -> list:
+        return list(self._by_channel.get(channel_id, {}).values())
+
+    def created_by(self, user_id) -> list:
+        return list(self._by_creator.get(user_id, {}).values())
+
+    def joined_by(self, user_id) -> list:
+        return list(self._by_member.get(user_id, {}).values())
+
+    def add(self, group: Group):
+        if group.message_id is None:
+            raise ValueError("Group must have a message ID before it can be registered")
+        self._index(group)
+        self._persist(group)
+
+    def restore(self, groups):
+        """Index groups loaded from the store without writing them back."""
+        for group in groups:
+            self._index(group)
+
+    def _index(self, group: Group):
+        if group.names is not self.names:
+            self.names.update(group.names)
+            group.names = self.names
+        self._by_message[group.message_id] = group
+        self._by_channel.setdefault(group.channel_id, {})[group.message_id] = group
+        self._by_creator.setdefault(group.creator, {})[group.message_id] = group
+        for user_id in group.players:
+            self._by_member.setdefault(user_id, {})[group.message_id] = group
+
+    def remove(self, message_id):
+        """Remove a group and return it, or None if it was already gone."""
+        group = self._by_message.pop(message_id, None)
+        if group is None:
+            return None
+        self._unindex(self._by_channel, group.channel_id, message_id)
+        self._unindex(self._by_creator, group.creator, message_id)
+        for user_id in group.players:
+            self._unindex(self._by_member, user_id, message_id)
+        # The group may still be rendered once more (expired, cancelled), so it takes its own names along
+        group.names = group.display_names()
+        for user_id in group.names:
+            self._forget_name(user_id)
+        if self.store is not None:
+            self.store.delete(message_id)
+        return group
+
+    def join(self, group: Group, user_id: int, role: str, display_name: str = None):
+        """Put a user in a role. The caller is responsible for checking the slot is free."""
+        if role == "tank":
+            group.tank = user_id
+        elif role == "healer":
+            group.healer = user_id
+        elif role == "dps":
+            group.dps.append(user_id)
+        else:
+            raise ValueError(f"Unknown role: {role}")
+        group.players.add(user_id)
+        group.version += 1
+        if display_name is not None:
+            group.names[user_id] = display_name
+        if group.message_id in self._by_message:
+            self._by_member.setdefault(user_id, {})[group.message_id] = group
+            self._persist(group)
+
+    def leave(self, group: Group, user_id: int):
+        """Remove a user from whatever role they hold and return that role, or None."""
+        role = group.role_of(user_id)
+        if role == "tank":
+            group.tank = None
+        elif role == "healer":
+            group.healer = None
+        elif role == "dps":
+            group.dps.remove(user_id)
+        group.players.discard(user_id)
+        group.version += 1
+        if group.profiles:
+            group.profiles.pop(user_id, None)
+        self._unindex(self._by_member, user_id, group.message_id)
+        if group.names is self.names:
+            self._forget_name(user_id)
+        elif user_id != group.creator:
+            group.names.pop(user_id, None)
+        if group.message_id in self._by_message:
+            self._persist(group)
+        return role
+
+    def _forget_name(self, user_id):
+        # Kept while the user is in, or created, any open group in the guild
+        if user_id not in self._by_member and user_id not in self._by_creator:
+            self.names.pop(user_id, None)
+
+    def _persist(self, group: Group):
+        if self.store is not None:
+            self.store.save(group)
+
+    @staticmethod
+    def _unindex(index, key, message_id):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(message_id, None)
+        if not bucket:
+            del index[key]
+
+
+class GuildRegistries:
+    """One GroupRegistry per guild, so a busy guild never slows lookups in another."""
+
+    def __init__(self, store=None):
+        self.store = store
+        self._guilds = {}  # guild ID -> GroupRegistry
+
+    def guild(self, guild_id) -> GroupRegistry:
+        registry = self._guilds.get(guild_id)
+        if registry is None:
+            registry = self._guilds[guild_id] = GroupRegistry(self.store)
+        return registry
+
+    def restore(self, groups):
+        for group in groups:
+            self.guild(group.guild_id).restore((group,))
+
+    def set_store(self, store):
+        """Attach or detach (None) the store for every guild, e.g. to compare against the in-memory path."""
+        self.store = store
+        for registry in self._guilds.values():
+            registry.store = store
+
+    def __len__(self):
+        return sum(len(registry) for registry in self._guilds.values())
+
+    def __iter__(self):
+        for registry in list(self._guilds.values()):
+            yield from registry
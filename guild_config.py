@@ -0,0 +1,70 @@
+# guild_config.py
+import json
+from renderer import GroupRenderer
+
+# Custom Discord emoji IDs
+DEFAULT_ROLE_ICONS = {
+    "tank": "<:tank:1310400665239027813>",
+    "healer": "<:heal:1310400663485943848>",
+    "dps": "<:dps:1310400661569146890>"
+}
+
+# Discord Role IDs
+DEFAULT_ROLE_IDS = {
+    "tank": 1374336518495146095,
+    "healer": 1374336572538753104,
+    "dps": 1374336600703762543
+}
+
+
+class GuildConfig:
+    """Role IDs, role emoji, allowed channels and ping style for one guild."""
+    __slots__ = ("guild_id", "role_ids", "role_icons", "channels", "ping_digest", "renderer")
+
+    def __init__(self, guild_id=None, role_ids=None, role_icons=None, channels=None, ping_digest=False):
+        self.guild_id = guild_id
+        self.role_ids = {**DEFAULT_ROLE_IDS, **(role_ids or {})}
+        self.role_icons = {**DEFAULT_ROLE_ICONS, **(role_icons or {})}
+        self.channels = frozenset(channels) if channels else None  # None means every channel
+        self.ping_digest = ping_digest  # One refreshed "groups needing roles" message per channel instead of a ping per group
+        self.renderer = GroupRenderer(self.role_icons)
+
+    def allows(self, channel_id) -> bool:
+        return self.channels is None or channel_id in self.channels
+
+
+class GuildConfigs:
+    """Per-guild settings loaded from a JSON file, falling back to the "default" entry.
+
+    {
+        "default": {"role_ids": {"tank": 1, "healer": 2, "dps": 3}},
+        "123456789": {"role_icons": {"tank": "🛡️"}, "channels": [111, 222], "ping_digest": true}
+    }
+    """
+
+    def __init__(self, entries: dict = None):
+        entries = entries or {}
+        default = entries.get("default", {})
+        self.default = GuildConfig(**default)
+        self._guilds = {}
+        for key, entry in entries.items():
+            if key == "default":
+                continue
+            merged = {**default, **entry}
+            merged["role_ids"] = {**default.get("role_ids", {}), **entry.get("role_ids", {})}
+            merged["role_icons"] = {**default.get("role_icons", {}), **entry.get("role_icons", {})}
+            self._guilds[int(key)] = GuildConfig(guild_id=int(key), **merged)
+
+    def get(self, guild_id) -> GuildConfig:
+        return self._guilds.get(guild_id, self.default)
+
+    def __iter__(self):
+        return iter(self._guilds.values())
+
+
+def load_guild_configs(path: str) -> GuildConfigs:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return GuildConfigs(json.load(f))
+    except FileNotFoundError:
+        return GuildConfigs()
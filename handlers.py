@@ -2,31 +2,138 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from blizzard_api import get_current_dungeons, CURRENT_DUNGEONS
+from blizzard_api import DungeonPool, character_key, realm_slug
+from dungeon_search import DungeonIndex
+from group_registry import Group
+from guild_config import DEFAULT_ROLE_ICONS, GuildConfig
+from rest_scheduler import DEFERRABLE, NORMAL, outbound
+from matchmaking import MatchQueue, QueueEntry
+from metrics import instrumented
+# Live state is kept in its own module so reloading this extension keeps every open group
+from state import (
+    MATCH_TICK_SECONDS, MATCHED_GROUPS, active_groups, character_links, character_profiles, embed_updates,
+    group_history, group_store, guild_configs, match_posts, match_queues, ping_digest, timers,
+)
 from enum import Enum
 from datetime import datetime, timedelta
+import asyncio
+import itertools
+import logging
+import os
+import random
 import re
+import time
+
+log = logging.getLogger(__name__)
 
 class Role(str, Enum):
     TANK = "tank"
     HEALER = "healer"
     DPS = "dps"
 
-# Custom Discord emoji IDs
-ROLE_ICONS = {
-    "tank": "<:tank:1310400665239027813>",
-    "healer": "<:heal:1310400663485943848>",
-    "dps": "<:dps:1310400661569146890>"
-}
-
-# Discord Role IDs
-ROLE_IDS = {
-    "tank": 1374336518495146095,
-    "healer": 1374336572538753104,
-    "dps": 1374336600703762543
+ROLE_NAMES = {
+    "tank": "Tank",
+    "healer": "Healer",
+    "dps": "DPS"
 }
 
-active_groups = []  # Using a list instead of dict to store multiple groups
+# Start-time reminders and expiry of groups that never fill
+REMINDER_LEAD = timedelta(minutes=5)
+GROUP_EXPIRY = timedelta(minutes=int(os.getenv('GROUP_EXPIRY_MINUTES', '60')))  # Measured from the start time
+
+def retire_group(group: Group, outcome: str, keep_reminder: bool = False, last_role: str = None):
+    """Remove a group from the active groups, drop its pending timers and record how it ended.
+
+    Returns None if it was already gone.
+    """
+    removed = active_groups.guild(group.guild_id).remove(group.message_id)
+    timers.cancel((group.message_id, "expire"))
+    if not keep_reminder:
+        timers.cancel((group.message_id, "reminder"))
+    if removed is not None:
+        group_history.record(group, outcome, last_role=last_role)
+    return removed
+
+# How often the /queue matcher runs, and how long players stay queued
+QUEUE_TICK = float(os.getenv('QUEUE_TICK_SECONDS', '5'))
+QUEUE_TIMEOUT = timedelta(minutes=int(os.getenv('QUEUE_TIMEOUT_MINUTES', '30')))
+MATCH_BUDGET = 0.05  # Seconds of matching per tick; anyone not reached waits for the next one
+
+def ping_digest_content(guild_id, channel_id):
+    """The digest for a channel: roles still missing across its open groups, with a line per group."""
+    config = guild_configs.get(guild_id)
+    icons = config.role_icons
+    needed = set()
+    lines = []
+    channel_groups = sorted(active_groups.guild(guild_id).in_channel(channel_id), key=lambda g: g.start_time)
+    for group in channel_groups:
+        missing = []
+        if not group.tank:
+            missing.append(f"{icons['tank']} Tank")
+            needed.add("tank")
+        if not group.healer:
+            missing.append(f"{icons['healer']} Healer")
+            needed.add("healer")
+        if len(group.dps) < 3:
+            missing.append(f"{icons['dps']} {3 - len(group.dps)} DPS")
+            needed.add("dps")
+        link = f"https://discord.com/channels/{guild_id}/{channel_id}/{group.message_id}"
+        lines.append(f"• [{group.dungeon} +{group.key_level}]({link}) at {group.start_time.strftime('%H:%M')} needs {', '.join(missing)}")
+
+    # Stay under Discord's 2000 character limit
+    while lines and sum(len(line) + 1 for line in lines) > 1800:
+        lines.pop()
+    hidden = len(channel_groups) - len(lines)
+    if hidden:
+        lines.append(f"…and {hidden} more")
+
+    mentions = " ".join(f"<@&{config.role_ids[role]}>" for role in ROLE_NAMES if role in needed)
+    return f"📣 {mentions} Groups looking for players:\n" + "\n".join(lines), frozenset(needed)
+
+def profile_summary(profile) -> str:
+    rating = profile["rating"]
+    return f"{profile['name']}-{profile['realm']}" + (f" ({rating:.0f})" if rating else "")
+
+def apply_cached_profiles(group: Group) -> dict:
+    """Show cached ratings for linked characters in the group. Returns the ones still to fetch."""
+    missing = {}
+    for user_id in group.players:
+        character = character_links.get(user_id)
+        if character is None:
+            continue
+        profile = character_profiles.peek(*character)
+        if profile is None:
+            missing[user_id] = character
+        else:
+            group.set_profile(user_id, profile_summary(profile))
+    return missing
+
+def fetch_missing_profiles(group: Group, message, missing: dict):
+    """Look up the remaining ratings in the background and edit the embed once they arrive, so no click waits on the API."""
+    if missing and character_profiles.client is not None:
+        asyncio.create_task(fetch_profiles(group, message, missing))
+
+async def fetch_profiles(group: Group, message, missing: dict):
+    profiles = await character_profiles.get_many(missing.values())
+    version = group.version
+    for user_id, profile in zip(missing, profiles):
+        if profile is not None and user_id in group.players:
+            group.set_profile(user_id, profile_summary(profile))
+    # Skip groups that were cancelled or expired in the meantime; their message is final
+    still_shown = group.is_full() or active_groups.guild(group.guild_id).get(group.message_id) is group
+    if group.version != version and still_shown:
+        renderer = guild_configs.get(group.guild_id).renderer
+        embed_updates.schedule(message, lambda: renderer.render(group))
+
+def post_done(task):
+    match_posts.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Failed to post matched group", exc_info=task.exception())
+
+def refresh_ping_digest(channel, guild_id):
+    """Queue a refresh of the channel's role-ping digest, in guilds that use one."""
+    if guild_configs.get(guild_id).ping_digest:
+        ping_digest.mark(channel, guild_id, lambda: ping_digest_content(guild_id, channel.id))
 
 def parse_time(time_str: str) -> datetime:
     """Parse time string in HH:MM format and return datetime object for today/tomorrow."""
@@ -48,21 +155,66 @@ def parse_time(time_str: str) -> datetime:
 
     return scheduled_time
 
+STATS_DUNGEONS = 10  # Busiest dungeons listed by /stats
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m {seconds}s" if minutes else f"{seconds}s"
+
 @app_commands.guild_only()
 class DungeonCommands(commands.Cog):
-    def __init__(self, bot, guild_id):
+    def __init__(self, bot):
         self.bot = bot
-        self.guild_id = guild_id
-        self.dungeon_pool = CURRENT_DUNGEONS  # Use pre-sorted list immediately
+        character_profiles.client = bot.blizzard
+        self.pool = DungeonPool(
+            bot.blizzard,
+            os.getenv('DUNGEON_CACHE_PATH', 'dungeon_cache.json'),
+            on_change=self.set_dungeon_pool,
+            connected_realm_id=int(os.getenv('BLIZZARD_CONNECTED_REALM_ID', '11'))
+        )
+        # Last known pool from disk (or the built-in list), available before any network call
+        self.set_dungeon_pool(self.pool.load_cached())
+        self.match_rounds = itertools.count()  # Picks which guild's queue is matched first each tick
 
     async def cog_load(self):
-        # Update dungeon pool from API if possible
-        try:
-            self.dungeon_pool = await get_current_dungeons()
-            print(f"🔁 Dungeon pool loaded: {self.dungeon_pool}")
-        except Exception as e:
-            print(f"Using default dungeon pool due to error: {e}")
-            pass  # Keep using CURRENT_DUNGEONS if API fails
+        # Revalidate the dungeon pool in the background; startup never waits on the API
+        if self.bot.blizzard is not None:
+            self.pool.start()
+
+        # Re-arm reminders and expiry for open groups: restored from disk at startup, or
+        # still pointing at the previous version of this cog after a reload
+        startup = not timers.running
+        if startup:
+            # Pick up the digests posted before the restart, so they are edited or removed instead of left behind
+            for channel_id, (guild_id, message_id, roles) in group_store.load_digests().items():
+                channel = self.bot.get_partial_messageable(channel_id)
+                ping_digest.restore(channel, guild_id, message_id, roles)
+                if guild_configs.get(guild_id).ping_digest:
+                    refresh_ping_digest(channel, guild_id)
+                else:
+                    ping_digest.mark(channel, guild_id, lambda: ("", frozenset()))  # Digests were turned off since
+        for group in active_groups:
+            self.schedule_group_timers(group)
+            if startup:
+                refresh_ping_digest(self.bot.get_partial_messageable(group.channel_id), group.guild_id)
+        timers.start()
+        self.matcher = asyncio.create_task(self.run_matcher())
+
+    async def cog_unload(self):
+        # Only this cog's own tasks; timers, digests and stores belong to the bot and keep running across a reload
+        # Matching never awaits, so cancelling can't cut a tick short; groups still being posted are in match_posts
+        self.matcher.cancel()
+        await self.pool.close()
+
+    def set_dungeon_pool(self, dungeons):
+        # Build the search index first, then swap both in so readers always see a complete pool
+        dungeon_pool = tuple(dungeons)
+        self.dungeon_index = DungeonIndex(dungeon_pool)
+        self.dungeon_pool = dungeon_pool
+        log.info("Dungeon pool loaded", extra={"dungeons": self.dungeon_pool})
 
     @app_commands.command(name="startdungeon", description="Start a Mythic+ group")
     @app_commands.describe(
@@ -71,6 +223,7 @@ class DungeonCommands(commands.Cog):
         your_role="Your role in the group",
         start_time="When to start (e.g., 14:30 or 'now'). Default is now."
     )
+    @instrumented("startdungeon")
     async def startdungeon(
         self,
         interaction: discord.Interaction,
@@ -85,68 +238,94 @@ class DungeonCommands(commands.Cog):
             await interaction.response.send_message(f"❌ {str(e)}", ephemeral=True)
             return
 
+        config = guild_configs.get(interaction.guild_id)
+        if not config.allows(interaction.channel_id):
+            channels = ", ".join(f"<#{channel_id}>" for channel_id in config.channels)
+            await interaction.response.send_message(f"❌ Groups can only be started in {channels}.", ephemeral=True)
+            return
+
         if dungeon not in self.dungeon_pool:
             await interaction.response.send_message(f"❌ Invalid dungeon. Available: {', '.join(self.dungeon_pool)}", ephemeral=True)
             return
 
         # No need to check for existing groups - multiple groups are now allowed
 
-        group_info = {
-            "dungeon": dungeon,
-            "key_level": key_level,
-            "tank": None,
-            "healer": None,
-            "dps": [],
-            "players": set(),  # Track all players in group
-            "creator": interaction.user,  # Track who created the group
-            "start_time": scheduled_time  # Store the start time
-        }
+        groups = active_groups.guild(interaction.guild_id)
+        group = Group(dungeon, key_level, interaction.user.id, scheduled_time, guild_id=interaction.guild_id)
 
         # Auto-assign creator to their selected role
-        if your_role == Role.TANK:
-            group_info["tank"] = interaction.user
-        elif your_role == Role.HEALER:
-            group_info["healer"] = interaction.user
-        elif your_role == Role.DPS:
-            group_info["dps"].append(interaction.user)
-        group_info["players"].add(interaction.user)
+        groups.join(group, interaction.user.id, your_role.value, interaction.user.display_name)
+        missing_profiles = apply_cached_profiles(group)
         
         # Create initial status message
-        status_embed = self.create_group_status(group_info)
-        view = GroupView(interaction.channel_id)
+        status_embed = config.renderer.render(group)
+        view = GroupView(config)
         
-        # Create ping message for needed roles
-        ping_message = self.create_role_ping_message(your_role)
+        # Create ping message for needed roles, unless the channel digest pings them
+        ping_message = "" if config.ping_digest else self.create_role_ping_message(your_role, config) + "\n"
         
         # Create start time message
         time_msg = "Starting now!" if start_time.lower() == "now" else f"Scheduled for: {scheduled_time.strftime('%H:%M')}"
         
         # Send and store message
         await interaction.response.send_message(
-            f"{ping_message}\n🌀 Group started for **{dungeon}** at **+{key_level}**!\n⏰ {time_msg}",
+            f"{ping_message}🌀 Group started for **{dungeon}** at **+{key_level}**!\n⏰ {time_msg}",
             embed=status_embed,
             view=view,
             allowed_mentions=discord.AllowedMentions(roles=True)
         )
         
-        # Add group to active groups list with message ID for reference
+        # Register the group under its message ID for reference
         group_message = await interaction.original_response()
-        group_info["message_id"] = group_message.id
-        group_info["channel_id"] = interaction.channel_id
-        active_groups.append(group_info)
+        group.message_id = group_message.id
+        group.channel_id = interaction.channel_id
+        groups.add(group)
+        self.schedule_group_timers(group)
+        refresh_ping_digest(interaction.channel, interaction.guild_id)
+        fetch_missing_profiles(group, group_message, missing_profiles)
+
+    def schedule_group_timers(self, group: Group):
+        remind_at = group.start_time - REMINDER_LEAD
+        if remind_at > datetime.now():
+            timers.schedule((group.message_id, "reminder"), remind_at.timestamp(), lambda: self.remind_group(group))
+        expire_at = group.start_time + GROUP_EXPIRY
+        timers.schedule((group.message_id, "expire"), expire_at.timestamp(), lambda: self.expire_group(group))
+
+    async def remind_group(self, group: Group):
+        """Ping everyone in the group shortly before it starts. Also runs for groups that already filled."""
+        mentions = " ".join(f"<@{user_id}>" for user_id in group.players)
+        channel = self.bot.get_partial_messageable(group.channel_id)
+        await outbound.call(NORMAL, ("channel", channel.id), lambda: channel.send(
+            f"⏰ **{group.dungeon} +{group.key_level}** starts in 5 minutes! {mentions}",
+            allowed_mentions=discord.AllowedMentions(users=True)
+        ))
+
+    async def expire_group(self, group: Group):
+        """Close a group that never filled and mark its message as expired."""
+        async with group.lock:
+            if not retire_group(group, "expired"):
+                return
+        embed_updates.cancel(group.message_id)
 
-    def create_role_ping_message(self, filled_role: Role) -> str:
+        channel = self.bot.get_partial_messageable(group.channel_id)
+        refresh_ping_digest(channel, group.guild_id)
+        message = channel.get_partial_message(group.message_id)
+        embed = guild_configs.get(group.guild_id).renderer.render(group, expired=True)
+        await outbound.call(DEFERRABLE, ("channel", channel.id), lambda: message.edit(embed=embed, view=None),
+                            merge_key=("edit", message.id))
+
+    def create_role_ping_message(self, filled_role: Role, config: GuildConfig) -> str:
         """Create a message that pings all needed roles except the one already filled."""
         needed_roles = []
         
         # Always include Tank and Healer if not filled
         if filled_role != Role.TANK:
-            needed_roles.append(f"<@&{ROLE_IDS['tank']}>")
+            needed_roles.append(f"<@&{config.role_ids['tank']}>")
         if filled_role != Role.HEALER:
-            needed_roles.append(f"<@&{ROLE_IDS['healer']}>")
+            needed_roles.append(f"<@&{config.role_ids['healer']}>")
             
         # Always include DPS role, even if creator is DPS (since we need 3)
-        needed_roles.append(f"<@&{ROLE_IDS['dps']}>")
+        needed_roles.append(f"<@&{config.role_ids['dps']}>")
             
         return " ".join(needed_roles)
 
@@ -154,21 +333,22 @@ class DungeonCommands(commands.Cog):
     @app_commands.describe(
         message_id="The ID of the group message to cancel (Right click the group message -> Copy Message ID)"
     )
+    @instrumented("canceldungeon")
     async def canceldungeon(self, interaction: discord.Interaction, message_id: str = None):
+        groups = active_groups.guild(interaction.guild_id)
         if not message_id:
             # List all groups in the channel
-            channel_groups = [g for g in active_groups if g["channel_id"] == interaction.channel_id]
+            channel_groups = groups.in_channel(interaction.channel_id)
             if not channel_groups:
                 await interaction.response.send_message("❌ No active groups in this channel.", ephemeral=True)
                 return
             
             if len(channel_groups) == 1:
                 group = channel_groups[0]
-                message_id = str(group["message_id"])
             else:
                 # Show list of groups
                 groups_list = "\n".join([
-                    f"• {g['dungeon']} +{g['key_level']} (Created by {g['creator'].display_name}) - ID: {g['message_id']}"
+                    f"• {g.dungeon} +{g.key_level} (Created by {g.name(g.creator)}) - ID: {g.message_id}"
                     for g in channel_groups
                 ])
                 await interaction.response.send_message(
@@ -176,103 +356,288 @@ class DungeonCommands(commands.Cog):
                     ephemeral=True
                 )
                 return
-
-        # Find the group with the specified message ID
-        group = next((g for g in active_groups if str(g["message_id"]) == message_id), None)
+        else:
+            # Find the group with the specified message ID
+            group = groups.get(int(message_id)) if message_id.strip().isdigit() else None
         
         if not group:
             await interaction.response.send_message("❌ Group not found. Please check the message ID.", ephemeral=True)
             return
 
         # Only allow the group creator or administrators to cancel
-        if interaction.user != group["creator"] and not interaction.user.guild_permissions.administrator:
+        if interaction.user.id != group.creator and not interaction.user.guild_permissions.administrator:
             await interaction.response.send_message("❌ Only the group creator or administrators can cancel the group.", ephemeral=True)
             return
 
-        # Remove the group
-        active_groups.remove(group)
+        # Remove the group, unless a concurrent click filled or removed it first
+        async with group.lock:
+            removed = retire_group(group, "cancelled")
+        if not removed:
+            await interaction.response.send_message("❌ Group not found. Please check the message ID.", ephemeral=True)
+            return
+        embed_updates.cancel(group.message_id)  # A coalesced edit must not re-render the cancelled group
+        refresh_ping_digest(interaction.channel, interaction.guild_id)
         
         # Send confirmation
         embed = discord.Embed(
             title="Group Cancelled",
-            description=f"The group for **{group['dungeon']} +{group['key_level']}** has been cancelled.",
+            description=f"The group for **{group.dungeon} +{group.key_level}** has been cancelled.",
             color=discord.Color.red()
         )
         
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(name="linkchar", description="Show your character and Mythic+ rating on groups you join")
+    @app_commands.describe(realm="Your character's realm (e.g., Area 52)", character="Your character's name")
+    @instrumented("linkchar")
+    async def linkchar(self, interaction: discord.Interaction, realm: str, character: str):
+        slug = realm_slug(realm)
+        name = character_key(character)
+        if not slug or not name:
+            await interaction.response.send_message(
+                "❌ Please give a realm name (letters, numbers, spaces and apostrophes) and a character name (letters only).",
+                ephemeral=True
+            )
+            return
+
+        character_links[interaction.user.id] = (slug, name)
+        await interaction.response.send_message(
+            f"🔗 Linked **{character.strip().capitalize()}** on **{realm.strip()}**. Your rating will show on groups you join.",
+            ephemeral=True
+        )
+        await group_store.link_character(interaction.user.id, slug, name)
+        # Warm the cache so the first group this player joins already has their rating
+        if character_profiles.client is not None:
+            await character_profiles.get_many([(slug, name)])
+
+    @app_commands.command(name="unlinkchar", description="Stop showing your character on groups")
+    @instrumented("unlinkchar")
+    async def unlinkchar(self, interaction: discord.Interaction):
+        if character_links.pop(interaction.user.id, None) is None:
+            await interaction.response.send_message("❌ You don't have a linked character.", ephemeral=True)
+            return
+        await interaction.response.send_message("Your character has been unlinked.", ephemeral=True)
+        await group_store.unlink_character(interaction.user.id)
+
+    @app_commands.command(name="stats", description="Show Mythic+ group statistics for this server")
+    @instrumented("stats")
+    async def stats(self, interaction: discord.Interaction):
+        summary = group_history.summary(interaction.guild_id)
+        if summary is None:
+            await interaction.response.send_message("No groups have finished in this server yet.", ephemeral=True)
+            return
+
+        dungeons = sorted(summary["dungeons"].items(), key=lambda item: item[1]["total"], reverse=True)
+        embed = discord.Embed(title="📊 Mythic+ Group Stats", color=discord.Color.blue())
+        for name, totals in dungeons[:STATS_DUNGEONS]:
+            fill = totals["average_fill_seconds"]
+            embed.add_field(
+                name=name,
+                value=(
+                    f"{totals['total']} groups: ✅ {totals['completed']} · ❌ {totals['cancelled']} · ⌛ {totals['expired']}\n"
+                    f"Average key +{totals['average_key']:.1f}"
+                    + (f" · fills in {format_duration(fill)}" if fill is not None else "")
+                ),
+                inline=False
+            )
+        role = summary["most_needed_role"]
+        if role is not None:
+            embed.set_footer(text=f"Most needed role: {ROLE_NAMES[role]} ({summary['needed'][role]} groups waiting on one)")
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="queue", description="Queue for a Mythic+ group and get matched automatically")
+    @app_commands.describe(
+        role="The role you want to play",
+        min_level="Lowest key level you'll run",
+        max_level="Highest key level you'll run",
+        dungeons="Dungeons you want, separated by commas. Default is any."
+    )
+    @instrumented("queue")
+    async def queue(
+        self,
+        interaction: discord.Interaction,
+        role: Role,
+        min_level: app_commands.Range[int, 0, 20],
+        max_level: app_commands.Range[int, 0, 20],
+        dungeons: str = None
+    ):
+        config = guild_configs.get(interaction.guild_id)
+        if not config.allows(interaction.channel_id):
+            channels = ", ".join(f"<#{channel_id}>" for channel_id in config.channels)
+            await interaction.response.send_message(f"❌ You can only queue in {channels}.", ephemeral=True)
+            return
+
+        if min_level > max_level:
+            await interaction.response.send_message("❌ The lowest key level can't be above the highest.", ephemeral=True)
+            return
+
+        preferred = []
+        for name in (dungeons or "").split(","):
+            name = name.strip()
+            if not name:
+                continue
+            # Only a confident match counts; a fuzzy one could queue the player for a dungeon they never picked
+            found = name if name in self.dungeon_pool else self.dungeon_index.resolve(name)
+            if found is None:
+                suggestions = self.dungeon_index.search(name, limit=3)
+                hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+                await interaction.response.send_message(f"❌ Unknown dungeon: {name}.{hint}", ephemeral=True)
+                return
+            preferred.append(found)
+
+        queue = match_queues.setdefault(interaction.guild_id, MatchQueue())
+        queue.add(QueueEntry(
+            interaction.user.id, interaction.user.display_name, role.value, min_level, max_level,
+            preferred, interaction.channel_id
+        ))
+
+        wanted = ", ".join(dict.fromkeys(preferred)) if preferred else "any dungeon"
+        await interaction.response.send_message(
+            f"🔎 Queued as **{ROLE_NAMES[role.value]}** for **+{min_level}–+{max_level}** ({wanted}). "
+            f"You'll be pinged here when a group forms. Use `/leavequeue` to leave.",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="leavequeue", description="Leave the matchmaking queue")
+    @instrumented("leavequeue")
+    async def leavequeue(self, interaction: discord.Interaction):
+        queue = match_queues.get(interaction.guild_id)
+        if queue is None or queue.remove(interaction.user.id) is None:
+            await interaction.response.send_message("❌ You're not in the queue.", ephemeral=True)
+            return
+        await interaction.response.send_message("You have left the queue.", ephemeral=True)
+
+    async def run_matcher(self):
+        while True:
+            await asyncio.sleep(QUEUE_TICK)
+            try:
+                self.match_queued_players()
+            except Exception:
+                log.exception("Matchmaking failed")
+
+    def match_queued_players(self) -> list:
+        """Form groups from every guild's queue and start posting them. Returns the posting tasks.
+
+        The posts are tracked in match_posts rather than awaited, so a slow or rate-limited
+        channel never holds up the matcher, a reload or shutdown.
+        """
+        end = time.perf_counter() + MATCH_BUDGET
+        queued_before = time.time() - QUEUE_TIMEOUT.total_seconds()
+        formed = []
+        with MATCH_TICK_SECONDS.time():
+            # Each guild gets an equal share of what is left of the budget, and a different guild goes
+            # first every tick, so one guild's huge queue never starves the others
+            queues = list(match_queues.items())
+            if queues:
+                first = next(self.match_rounds) % len(queues)
+                queues = queues[first:] + queues[:first]
+            for i, (guild_id, queue) in enumerate(queues):
+                queue.expire(queued_before)
+                now = time.perf_counter()
+                deadline = now + max(end - now, 0) / (len(queues) - i)
+                formed.extend((guild_id, match) for match in queue.match(deadline))
+
+        posts = []
+        for guild_id, match in formed:
+            task = asyncio.create_task(self.post_match(guild_id, match))
+            match_posts.add(task)
+            task.add_done_callback(post_done)
+            posts.append(task)
+        return posts
+
+    async def post_match(self, guild_id, match) -> Group:
+        """Announce a matched group with the usual group embed, in the channel of whoever waited longest."""
+        config = guild_configs.get(guild_id)
+        leader = min(match.members, key=lambda entry: entry.queued_at)
+        candidates = [dungeon for dungeon in self.dungeon_pool if match.dungeons is None or dungeon in match.dungeons]
+        dungeon = random.choice(candidates or sorted(match.dungeons))
+
+        # Matched groups are never posted as open groups, so they go straight into the history as filled
+        group = Group(dungeon, match.key_level, leader.user_id, datetime.now(), guild_id=guild_id,
+                      created_at=datetime.fromtimestamp(leader.queued_at))
+        groups = active_groups.guild(guild_id)
+        for entry in match.members:
+            groups.join(group, entry.user_id, entry.role, entry.name)
+
+        mentions = " ".join(f"<@{entry.user_id}>" for entry in match.members)
+        channel = self.bot.get_partial_messageable(leader.channel_id)
+        try:
+            message = await outbound.call(NORMAL, ("channel", channel.id), lambda: channel.send(
+                f"{mentions}\n✅ Matched a group for **{dungeon} +{match.key_level}**! {group.name(leader.user_id)} has the lead.",
+                embed=config.renderer.render(group),
+                allowed_mentions=discord.AllowedMentions(users=True)
+            ))
+        except Exception:
+            # Nobody was told about this group, so put everyone back in line where they were
+            match_queues.setdefault(guild_id, MatchQueue()).restore(match.members)
+            raise
+        MATCHED_GROUPS.inc()
+        group.message_id = message.id
+        group.channel_id = leader.channel_id
+        group_history.record(group, "completed")
+        return group
+
+    @queue.autocomplete('dungeons')
+    @instrumented("queue.autocomplete")
+    async def queue_dungeons_autocomplete(
+        self,
+        interaction: discord.Interaction,
+        current: str,
+    ) -> list[app_commands.Choice[str]]:
+        # Complete the last name in the comma-separated list, keeping the ones before it
+        head, _, last = current.rpartition(",")
+        chosen = [name.strip() for name in head.split(",") if name.strip()]
+        prefix = "".join(f"{name}, " for name in chosen)
+        return [
+            app_commands.Choice(name=(prefix + dungeon)[:100], value=(prefix + dungeon)[:100])
+            for dungeon in self.dungeon_index.search(last, limit=25)
+            if dungeon not in chosen
+        ]
+
     @startdungeon.autocomplete('dungeon')
+    @instrumented("startdungeon.autocomplete")
     async def dungeon_autocomplete(
         self,
         interaction: discord.Interaction,
         current: str,
     ) -> list[app_commands.Choice[str]]:
-        # Fast, case-insensitive filtering
-        current_lower = current.lower()
+        # Alias, acronym and typo-tolerant matching from the prebuilt index
         return [
             app_commands.Choice(name=dungeon, value=dungeon)
-            for dungeon in self.dungeon_pool
-            if current_lower in dungeon.lower()
-        ][:25]
-
-    def create_group_status(self, group):
-        status = discord.Embed(
-            title=f"{group['dungeon']} +{group['key_level']}",
-            color=discord.Color.blue()
-        )
-
-        # Add start time as first field if it's not "now"
-        if (group['start_time'] - datetime.now()).total_seconds() > 60:  # If more than 1 minute in the future
-            time_str = group['start_time'].strftime('%H:%M')
-            status.add_field(
-                name="⏰ Start Time",
-                value=f"**{time_str}**",
-                inline=False
-            )
-        
-        # Tank status
-        tank_name = group['tank'].display_name if group['tank'] else "Not filled"
-        tank_status = "✅" if group['tank'] else "❌"
-        status.add_field(name=f"{ROLE_ICONS['tank']} Tank", value=f"{tank_status} {tank_name}", inline=False)
-        
-        # Healer status
-        healer_name = group['healer'].display_name if group['healer'] else "Not filled"
-        healer_status = "✅" if group['healer'] else "❌"
-        status.add_field(name=f"{ROLE_ICONS['healer']} Healer", value=f"{healer_status} {healer_name}", inline=False)
-        
-        # DPS status
-        dps_list = "\n".join([f"✅ {dps.display_name}" for dps in group['dps']])
-        if not dps_list:
-            dps_list = "❌ No DPS signed up"
-        status.add_field(name=f"{ROLE_ICONS['dps']} DPS ({len(group['dps'])}/3)", value=dps_list, inline=False)
-        
-        # Add group creator
-        status.set_footer(text=f"Created by {group['creator'].display_name}")
-        
-        return status
+            for dungeon in self.dungeon_index.search(current, limit=25)
+        ]
 
 class GroupView(discord.ui.View):
-    def __init__(self, channel_id):
+    def __init__(self, config: GuildConfig = None):
         super().__init__(timeout=None)
-        self.channel_id = channel_id
-
-    @discord.ui.button(label="Tank", style=discord.ButtonStyle.primary, custom_id="join_tank", emoji=ROLE_ICONS['tank'])
+        # Buttons on new messages use the guild's own emoji; the persistent view only matches custom IDs
+        if config is not None:
+            self.tank.emoji = config.role_icons['tank']
+            self.healer.emoji = config.role_icons['healer']
+            self.dps.emoji = config.role_icons['dps']
+
+    @discord.ui.button(label="Tank", style=discord.ButtonStyle.primary, custom_id="join_tank", emoji=DEFAULT_ROLE_ICONS['tank'])
+    @instrumented("button.tank")
     async def tank(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.assign_role(interaction, "tank")
 
-    @discord.ui.button(label="Healer", style=discord.ButtonStyle.success, custom_id="join_healer", emoji=ROLE_ICONS['healer'])
+    @discord.ui.button(label="Healer", style=discord.ButtonStyle.success, custom_id="join_healer", emoji=DEFAULT_ROLE_ICONS['healer'])
+    @instrumented("button.healer")
     async def healer(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.assign_role(interaction, "healer")
 
-    @discord.ui.button(label="DPS", style=discord.ButtonStyle.secondary, custom_id="join_dps", emoji=ROLE_ICONS['dps'])
+    @discord.ui.button(label="DPS", style=discord.ButtonStyle.secondary, custom_id="join_dps", emoji=DEFAULT_ROLE_ICONS['dps'])
+    @instrumented("button.dps")
     async def dps(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.assign_role(interaction, "dps")
 
     @discord.ui.button(label="Leave", style=discord.ButtonStyle.danger, custom_id="leave_group", emoji="🚪", row=1)
+    @instrumented("button.leave")
     async def leave(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.leave_group(interaction)
 
     @discord.ui.button(label="Copy ID", style=discord.ButtonStyle.secondary, custom_id="copy_id", emoji="📋", row=1)
+    @instrumented("button.copy_id")
     async def copy_id(self, interaction: discord.Interaction, button: discord.ui.Button):
         # Send the ID in a way that's easy to copy
         await interaction.response.send_message(
@@ -280,116 +645,132 @@ class GroupView(discord.ui.View):
             ephemeral=True
         )
 
+    async def update_group_message(self, interaction: discord.Interaction, group: Group, response_text: str):
+        renderer = guild_configs.get(group.guild_id).renderer
+        missing_profiles = apply_cached_profiles(group)
+        if embed_updates.claim(interaction.message):
+            # The updated roster is the response, so the click costs a single call
+            await interaction.response.edit_message(embed=renderer.render(group))
+        else:
+            # An edit for this message went out moments ago; confirm privately and fold this change into the next one
+            await interaction.response.send_message(response_text, ephemeral=True)
+            embed_updates.schedule(interaction.message, lambda: renderer.render(group))
+        refresh_ping_digest(interaction.channel, interaction.guild_id)
+        fetch_missing_profiles(group, interaction.message, missing_profiles)
+
     async def leave_group(self, interaction: discord.Interaction):
         # Find the group associated with this message
-        group = next((g for g in active_groups if g["message_id"] == interaction.message.id), None)
+        groups = active_groups.guild(interaction.guild_id)
+        group = groups.get(interaction.message.id)
 
         if not group:
             await interaction.response.send_message("❌ No active group.", ephemeral=True)
             return
 
         user = interaction.user
+        error = None
+        disbanded = False
+
+        # Check and update under the group's lock so concurrent clicks see each other's changes
+        async with group.lock:
+            if groups.get(group.message_id) is not group:
+                error = "❌ No active group."
+            # Check if user is in the group
+            elif user.id not in group.players:
+                error = "❌ You're not in this group."
+            # Don't allow creator to leave unless they're the last person
+            elif user.id == group.creator and len(group.players) > 1:
+                error = "❌ As the group creator, you can't leave while others are in the group. Use `/canceldungeon` instead."
+            else:
+                # Remove user from their role
+                role_left = groups.leave(group, user.id)
 
-        # Check if user is in the group
-        if user not in group["players"]:
-            await interaction.response.send_message("❌ You're not in this group.", ephemeral=True)
-            return
+                # If creator leaves and they're the last person, remove the group
+                if user.id == group.creator:
+                    retire_group(group, "cancelled")
+                    disbanded = True
 
-        # Remove user from their role
-        role_left = None
-        if group["tank"] == user:
-            group["tank"] = None
-            role_left = "Tank"
-        elif group["healer"] == user:
-            group["healer"] = None
-            role_left = "Healer"
-        elif user in group["dps"]:
-            group["dps"].remove(user)
-            role_left = "DPS"
-
-        # Remove from players set
-        group["players"].remove(user)
-
-        # Don't allow creator to leave unless they're the last person
-        if user == group["creator"] and len(group["players"]) > 0:
-            await interaction.response.send_message("❌ As the group creator, you can't leave while others are in the group. Use `/canceldungeon` instead.", ephemeral=True)
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
             return
 
-        # If creator leaves and they're the last person, remove the group
-        if user == group["creator"] and len(group["players"]) == 0:
-            active_groups.remove(group)
-            await interaction.message.delete()
+        if disbanded:
+            embed_updates.cancel(interaction.message.id)
+            refresh_ping_digest(interaction.channel, interaction.guild_id)
+            # Answer first; the delete waits its turn in the background, not inside this handler
             await interaction.response.send_message("Group has been removed as the creator left.", ephemeral=True)
+            outbound.submit(DEFERRABLE, ("channel", interaction.channel_id), interaction.message.delete)
             return
 
-        # Update the embed in the message
-        status_embed = DungeonCommands.create_group_status(None, group)
-        await interaction.message.edit(embed=status_embed)
-        
-        # Send confirmation to user
-        await interaction.response.send_message(f"You have left the group (was {role_left}).", ephemeral=True)
+        # Update the embed and confirm in as few REST calls as possible
+        await self.update_group_message(interaction, group, f"You have left the group (was {ROLE_NAMES[role_left]}).")
 
     async def assign_role(self, interaction: discord.Interaction, role):
         # Find the group associated with this message
-        group = next((g for g in active_groups if g["message_id"] == interaction.message.id), None)
+        groups = active_groups.guild(interaction.guild_id)
+        group = groups.get(interaction.message.id)
 
         if not group:
             await interaction.response.send_message("❌ No active group.", ephemeral=True)
             return
 
         user = interaction.user
+        role_icons = guild_configs.get(interaction.guild_id).role_icons
+        error = None
+
+        # Check and claim the slot under the group's lock; other groups are not blocked
+        async with group.lock:
+            if groups.get(group.message_id) is not group:
+                error = "❌ No active group."
+            # Check if user is already in the group
+            elif user.id in group.players:
+                error = "❌ You're already in this group."
+            elif role == "tank" and group.tank:
+                error = f"{role_icons['tank']} Tank slot already filled."
+            elif role == "healer" and group.healer:
+                error = f"{role_icons['healer']} Healer slot already filled."
+            elif role == "dps" and len(group.dps) >= 3:
+                error = f"{role_icons['dps']} All DPS slots are filled."
+            else:
+                groups.join(group, user.id, role, user.display_name)
 
-        # Check if user is already in the group
-        if user in group["players"]:
-            await interaction.response.send_message("❌ You're already in this group.", ephemeral=True)
-            return
-
-        response_text = None
-
-        if role == "tank":
-            if group["tank"]:
-                await interaction.response.send_message(f"{ROLE_ICONS['tank']} Tank slot already filled.", ephemeral=True)
-                return
-            group["tank"] = user
-            response_text = f"{user.display_name} joined as **Tank** {ROLE_ICONS['tank']}"
-
-        elif role == "healer":
-            if group["healer"]:
-                await interaction.response.send_message(f"{ROLE_ICONS['healer']} Healer slot already filled.", ephemeral=True)
-                return
-            group["healer"] = user
-            response_text = f"{user.display_name} joined as **Healer** {ROLE_ICONS['healer']}"
+                # Only the click that fills the last slot sees the group become ready
+                ready = group.is_full()
+                if ready:
+                    retire_group(group, "completed", keep_reminder=True, last_role=role)
 
-        elif role == "dps":
-            if len(group["dps"]) >= 3:
-                await interaction.response.send_message(f"{ROLE_ICONS['dps']} All DPS slots are filled.", ephemeral=True)
-                return
-            group["dps"].append(user)
-            response_text = f"{user.display_name} joined as **DPS** {ROLE_ICONS['dps']}"
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
 
-        # Add user to players set
-        group["players"].add(user)
+        response_text = f"{user.display_name} joined as **{ROLE_NAMES[role]}** {role_icons[role]}"
 
-        # Update the embed in the message
-        status_embed = DungeonCommands.create_group_status(None, group)
-        await interaction.message.edit(embed=status_embed)
-        
-        # Send confirmation to user
-        await interaction.response.send_message(response_text, ephemeral=True)
+        # Update the embed and confirm in as few REST calls as possible
+        await self.update_group_message(interaction, group, response_text)
 
-        # Check if group is ready
-        if group["tank"] and group["healer"] and len(group["dps"]) == 3:
+        # Announce the group once it is full
+        if ready:
             # Get time info for completion message
             time_info = ""
-            if (group['start_time'] - datetime.now()).total_seconds() > 60:
-                time_info = f"\n⏰ Starting at: {group['start_time'].strftime('%H:%M')}"
+            if (group.start_time - datetime.now()).total_seconds() > 60:
+                time_info = f"\n⏰ Starting at: {group.start_time.strftime('%H:%M')}"
 
-            await interaction.channel.send(
-                f"✅ Group for **{group['dungeon']} +{group['key_level']}** is ready!{time_info}\n"
+            await outbound.call(NORMAL, ("webhook", interaction.id), lambda: interaction.followup.send(
+                f"✅ Group for **{group.dungeon} +{group.key_level}** is ready!{time_info}\n"
                 "```\n"
-                f"{ROLE_ICONS['tank']} Tank:   {group['tank'].display_name}\n"
-                f"{ROLE_ICONS['healer']} Healer: {group['healer'].display_name}\n"
-                f"{ROLE_ICONS['dps']} DPS:    {', '.join([dps.display_name for dps in group['dps']])}\n"
+                f"{role_icons['tank']} Tank:   {group.name(group.tank)}\n"
+                f"{role_icons['healer']} Healer: {group.name(group.healer)}\n"
+                f"{role_icons['dps']} DPS:    {', '.join([group.name(dps) for dps in group.dps])}\n"
                 "```"
-            )
-            active_groups.remove(group)
+            ))
+
+async def setup(bot):
+    await bot.add_cog(DungeonCommands(bot))
+    # Persistent listener for the buttons on every group message, including ones posted before a restart or reload
+    bot.add_view(GroupView(None))
+
+async def teardown(bot):
+    # Stop every view from this version of the module so clicks after a reload reach the new code
+    for view in bot.persistent_views:
+        if isinstance(view, GroupView):
+            view.stop()
@@ -0,0 +1,748 @@
+# loadtest.py
+"""Offline load test for the group handlers.
+
+Drives DungeonCommands and every GroupView button through fake Discord objects that
+record each REST call, add configurable latency and enforce per-channel rate-limit
+buckets the way Discord does (a 429 followed by a retry after the bucket resets).
+Reports handler latency, time to first response, REST calls per operation and peak
+memory, and checks the group invariants afterwards.
+
+    python loadtest.py --groups 500 --latency 0.05
+    python loadtest.py --scenario stress --clicks 5000
+    python loadtest.py --scenario matchmaking --queued 5000
+    python loadtest.py --scenario spike --channels 100 --connections 10 [--no-outbound-scheduler]
+    python loadtest.py --scenario reload --groups 1000
+    python loadtest.py --scenario persistence --latency 0 --jitter 0
+    python loadtest.py --scenario memory --groups 1000
+"""
+import argparse
+import asyncio
+import contextvars
+import gc
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime
+from types import SimpleNamespace
+
+# The handlers read these at import time; point them somewhere harmless
+_tmpdir = tempfile.mkdtemp(prefix="loadtest-")
+os.environ.setdefault("BLIZZARD_CLIENT_ID", "loadtest")
+os.environ.setdefault("BLIZZARD_CLIENT_SECRET", "loadtest")
+os.environ["GROUPS_DB_PATH"] = os.path.join(_tmpdir, "groups.db")
+os.environ["GROUP_HISTORY_PATH"] = os.path.join(_tmpdir, "group_history.bin")
+os.environ["DUNGEON_CACHE_PATH"] = os.path.join(_tmpdir, "dungeon_cache.json")
+
+import discord
+from discord.ext import commands
+import handlers
+import metrics
+import state
+from group_registry import Group, GroupRegistry
+from handlers import DungeonCommands, GroupView, Role
+from matchmaking import MatchQueue, QueueEntry
+from rest_scheduler import DEFERRABLE, outbound
+
+current_op = contextvars.ContextVar("current_op", default="background")
+_ids = itertools.count(10**17)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class FakeRest:
+    """Records every simulated REST call and applies latency and rate-limit buckets."""
+
+    def __init__(self, latency=0.0, jitter=0.0, bucket_limit=5, bucket_window=5.0, seed=None, connections=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.bucket_limit = bucket_limit  # Calls per window per rate-limited route
+        self.bucket_window = bucket_window
+        self.random = random.Random(seed)
+        self.calls = defaultdict(int)  # (op, route) -> count
+        self.rate_limits = defaultdict(int)  # route -> 429s
+        self._buckets = defaultdict(deque)
+        # Shared HTTP connections (or global rate limit): every call holds one while on the wire
+        self.connections = asyncio.Semaphore(connections) if connections else None
+
+    async def call(self, route, bucket=None):
+        """Simulate one call. bucket names the shared rate-limit bucket, if any."""
+        self.calls[(current_op.get(), route)] += 1
+        while bucket is not None and not self._take(bucket):
+            # Discord answers 429 and the client retries once the bucket resets
+            self.rate_limits[route] += 1
+            await asyncio.sleep(self._buckets[bucket][0] + self.bucket_window - time.monotonic())
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if self.connections is not None:
+            async with self.connections:
+                await asyncio.sleep(max(delay, 0))
+        elif delay > 0:
+            await asyncio.sleep(delay)
+
+    def _take(self, bucket) -> bool:
+        now = time.monotonic()
+        window = self._buckets[bucket]
+        while window and window[0] <= now - self.bucket_window:
+            window.popleft()
+        if len(window) >= self.bucket_limit:
+            return False
+        window.append(now)
+        return True
+
+    def calls_by_op(self):
+        totals = defaultdict(int)
+        for (op, _), count in self.calls.items():
+            totals[op] += count
+        return totals
+
+
+class FakePermissions:
+    def __init__(self, administrator=False):
+        self.administrator = administrator
+
+
+class FakeMember:
+    def __init__(self, user_id, administrator=False):
+        self.id = user_id
+        self.display_name = f"Player{user_id}"
+        self.guild_permissions = FakePermissions(administrator)
+
+
+class FakeMessage:
+    def __init__(self, rest, channel, message_id=None):
+        self.rest = rest
+        self.channel = channel
+        self.id = message_id or next(_ids)
+        self.edits = 0
+        self.deleted = False
+        self.embed = None
+
+    async def edit(self, **kwargs):
+        await self.rest.call("message.edit", bucket=("edit", self.channel.id))
+        self.edits += 1
+        self.embed = kwargs.get("embed", self.embed)
+        return self
+
+    async def delete(self):
+        await self.rest.call("message.delete", bucket=("delete", self.channel.id))
+        self.deleted = True
+
+
+class FakeChannel:
+    def __init__(self, rest, channel_id=None):
+        self.rest = rest
+        self.id = channel_id or next(_ids)
+        self.sent = []
+        self.messages = {}
+
+    async def send(self, content=None, **kwargs):
+        await self.rest.call("channel.send", bucket=("send", self.id))
+        message = FakeMessage(self.rest, self)
+        self.sent.append(content)
+        self.messages[message.id] = message
+        return message
+
+    def get_partial_message(self, message_id):
+        return self.messages.get(message_id) or FakeMessage(self.rest, self, message_id)
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self, route):
+        if self._done:
+            raise discord.InteractionResponded(self.interaction)
+        self._done = True
+        await self.interaction.rest.call(route)
+        self.interaction.acked_at = time.perf_counter()
+
+    async def send_message(self, content=None, *, embed=None, ephemeral=False, **kwargs):
+        await self._respond("interaction.send_message")
+        self.interaction.replies.append(content)
+        if not ephemeral:
+            message = FakeMessage(self.interaction.rest, self.interaction.channel)
+            message.embed = embed
+            self.interaction.channel.messages[message.id] = message
+            self.interaction.sent_message = message
+
+    async def edit_message(self, **kwargs):
+        await self._respond("interaction.edit_message")
+        if "embed" in kwargs:
+            self.interaction.message.embed = kwargs["embed"]
+
+    async def defer(self, **kwargs):
+        await self._respond("interaction.defer")
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.rest.call("followup.send")
+        self.interaction.followups.append(content)
+
+
+class FakeInteraction:
+    def __init__(self, rest, user, channel, message=None):
+        self.rest = rest
+        self.id = next(_ids)
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild_id = 1
+        self.message = message
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.replies = []
+        self.followups = []
+        self.sent_message = None
+        self.started_at = time.perf_counter()
+        self.acked_at = None
+
+    async def original_response(self):
+        await self.rest.call("interaction.original_response")
+        return self.sent_message
+
+
+class FakeBot:
+    def __init__(self, rest):
+        self.rest = rest
+        self.blizzard = None
+        self.channels = {}
+
+    def get_partial_messageable(self, channel_id):
+        if channel_id not in self.channels:
+            self.channels[channel_id] = FakeChannel(self.rest, channel_id)
+        return self.channels[channel_id]
+
+
+class LoadTest:
+    def __init__(self, rest, channels=10, concurrency=200, seed=None):
+        self.rest = rest
+        self.concurrency = asyncio.Semaphore(concurrency)  # In-flight interactions, like a real burst
+        self.random = random.Random(seed)
+        self.bot = FakeBot(rest)
+        self.cog = DungeonCommands(self.bot)
+        self.view = GroupView(None)
+        self.channels = [self.bot.get_partial_messageable(next(_ids)) for _ in range(channels)]
+        self.latencies = defaultdict(list)  # op -> handler seconds
+        self.acks = defaultdict(list)  # op -> seconds until the interaction was answered
+        self.ops = defaultdict(int)
+        self.messages = {}  # group message ID -> FakeMessage
+        self.ready = defaultdict(int)  # group message ID -> ready announcements
+        self.queued = {}  # user ID -> (role, min level, max level, dungeons) as queued
+        self.matched = []  # Groups formed by the matcher
+        self.reload_errors = []
+        self.reload_seconds = None
+
+    async def run_op(self, op, handler, interaction):
+        token = current_op.set(op)
+        try:
+            async with self.concurrency:
+                interaction.started_at = time.perf_counter()
+                await handler(interaction)
+                self.latencies[op].append(time.perf_counter() - interaction.started_at)
+            if interaction.acked_at is not None:
+                self.acks[op].append(interaction.acked_at - interaction.started_at)
+            self.ops[op] += 1
+        finally:
+            current_op.reset(token)
+        for text in interaction.followups:
+            if text and "is ready!" in text:
+                self.ready[interaction.message.id] += 1
+        return interaction
+
+    async def startdungeon(self, creator, channel):
+        dungeon = self.random.choice(self.cog.dungeon_pool)
+        role = self.random.choice(list(Role))
+        interaction = FakeInteraction(self.rest, creator, channel)
+        await self.run_op(
+            "startdungeon",
+            lambda i: DungeonCommands.startdungeon.callback(self.cog, i, dungeon, self.random.randint(2, 20), role, "now"),
+            interaction
+        )
+        if interaction.sent_message is not None:
+            self.messages[interaction.sent_message.id] = interaction.sent_message
+        return interaction.sent_message
+
+    async def click(self, user, message, role, op=None):
+        interaction = FakeInteraction(self.rest, user, message.channel, message)
+        await self.run_op(op or f"button.{role}", lambda i: self.view.assign_role(i, role), interaction)
+
+    async def leave(self, user, message):
+        interaction = FakeInteraction(self.rest, user, message.channel, message)
+        await self.run_op("button.leave", self.view.leave_group, interaction)
+
+    async def copy_id(self, user, message):
+        interaction = FakeInteraction(self.rest, user, message.channel, message)
+        await self.run_op("button.copy_id", lambda i: GroupView.copy_id(self.view, i, None), interaction)
+
+    async def canceldungeon(self, user, message):
+        interaction = FakeInteraction(self.rest, user, message.channel)
+        await self.run_op(
+            "canceldungeon",
+            lambda i: DungeonCommands.canceldungeon.callback(self.cog, i, str(message.id)),
+            interaction
+        )
+
+    async def scenario_lifecycle(self, groups, players):
+        """Create groups, have players join and leave, then cancel whatever is left."""
+        creators = [FakeMember(next(_ids)) for _ in range(groups)]
+        pool = [FakeMember(next(_ids)) for _ in range(players)]
+        messages = await asyncio.gather(*[
+            self.startdungeon(creator, self.random.choice(self.channels)) for creator in creators
+        ])
+        group_messages = [(creator, m) for creator, m in zip(creators, messages) if m is not None]
+
+        clicks = []
+        joined = []
+        for _, message in group_messages:
+            for user in self.random.sample(pool, min(len(pool), 6)):
+                clicks.append(self.click(user, message, self.random.choice(["tank", "healer", "dps", "dps"])))
+                joined.append((user, message))
+        self.random.shuffle(clicks)
+        await asyncio.gather(*clicks)
+
+        leaving = self.random.sample(joined, len(joined) // 5)
+        await asyncio.gather(*[self.leave(user, message) for user, message in leaving])
+        await asyncio.gather(*[self.copy_id(user, message) for user, message in leaving[:len(leaving) // 2]])
+        await asyncio.gather(*[self.canceldungeon(creator, message) for creator, message in group_messages])
+
+    async def scenario_stress(self, groups, clicks, players):
+        """Fire thousands of concurrent clicks at a handful of groups."""
+        creators = [FakeMember(next(_ids)) for _ in range(groups)]
+        messages = [m for m in await asyncio.gather(*[
+            self.startdungeon(creator, self.random.choice(self.channels)) for creator in creators
+        ]) if m is not None]
+        pool = [FakeMember(next(_ids)) for _ in range(players)]
+        await asyncio.gather(*[
+            self.click(self.random.choice(pool), self.random.choice(messages), self.random.choice(["tank", "healer", "dps"]))
+            for _ in range(clicks)
+        ])
+
+    async def scenario_persistence(self, groups, clicks, players, rounds=4):
+        """Run the same clicks with the SQLite store attached and detached, alternating rounds to even out drift."""
+        pool = [FakeMember(next(_ids)) for _ in range(players)]
+        for _ in range(rounds):
+            for op, store in (("click.memory", None), ("click.sqlite", state.group_store)):
+                state.active_groups.set_store(store)
+                creators = [FakeMember(next(_ids)) for _ in range(groups)]
+                messages = [m for m in await asyncio.gather(*[
+                    self.startdungeon(creator, self.random.choice(self.channels)) for creator in creators
+                ]) if m is not None]
+                await asyncio.gather(*[
+                    self.click(self.random.choice(pool), self.random.choice(messages), self.random.choice(["tank", "healer", "dps"]), op)
+                    for _ in range(clicks // rounds)
+                ])
+                # Each round starts with no embed edits or writes left over from the last one
+                await asyncio.sleep(state.embed_updates.window * 2)
+                await outbound.drain()
+                await state.group_store.flush()
+        state.active_groups.set_store(state.group_store)
+
+    async def scenario_spike(self, groups, edits, clicks):
+        """Measure acks while idle, then again while a burst of deferrable embed edits competes for connections."""
+        creators = [FakeMember(next(_ids)) for _ in range(groups)]
+        messages = [m for m in await asyncio.gather(*[
+            self.startdungeon(creator, self.channels[i % len(self.channels)]) for i, creator in enumerate(creators)
+        ]) if m is not None]
+        users = [FakeMember(next(_ids)) for _ in range(clicks)]
+
+        async def acks(op):
+            # Copy ID is a pure ack: one interaction response and nothing else
+            for batch in range(0, len(users), 20):
+                await asyncio.gather(*[
+                    self.run_op(op, lambda i: GroupView.copy_id(self.view, i, None),
+                                FakeInteraction(self.rest, user, message.channel, message))
+                    for user, message in zip(users[batch:batch + 20], itertools.cycle(messages))
+                ])
+                await asyncio.sleep(0.01)
+
+        async def edit(message):
+            token = current_op.set("spike.edit")
+            start = time.perf_counter()
+            try:
+                await outbound.call(DEFERRABLE, ("channel", message.channel.id),
+                                             lambda: message.edit(embed=message.embed), merge_key=("edit", message.id))
+            finally:
+                self.latencies["spike.edit"].append(time.perf_counter() - start)
+                current_op.reset(token)
+
+        await acks("ack.idle")
+        self.random.shuffle(messages)
+        storm = asyncio.gather(*[edit(messages[i % len(messages)]) for i in range(edits)])
+        await acks("ack.spike")
+        await storm
+        self.ops["spike.edit"] = edits
+
+    async def enqueue(self, user, channel, role, min_level, max_level, dungeons):
+        interaction = FakeInteraction(self.rest, user, channel)
+        await self.run_op(
+            "queue",
+            lambda i: DungeonCommands.queue.callback(self.cog, i, role, min_level, max_level, ", ".join(dungeons) or None),
+            interaction
+        )
+        self.queued[user.id] = (role.value, min_level, max_level, frozenset(dungeons))
+
+    async def scenario_queue(self, players):
+        """Queue players with random roles, key ranges and dungeon preferences, then run the matcher until it stalls."""
+        roles = [Role.TANK] * 2 + [Role.HEALER] * 2 + [Role.DPS] * 6
+        await asyncio.gather(*[
+            self.enqueue(
+                FakeMember(next(_ids)), self.random.choice(self.channels), self.random.choice(roles),
+                low := self.random.randint(2, 16), low + self.random.randint(0, 4),
+                self.random.sample(self.cog.dungeon_pool, self.random.choice([0, 0, 1, 2, 3]))
+            )
+            for _ in range(players)
+        ])
+        token = current_op.set("matcher")
+        try:
+            while True:
+                start = time.perf_counter()
+                posts = self.cog.match_queued_players()
+                self.latencies["matcher"].append(time.perf_counter() - start)  # Matching only; the posts run on their own
+                self.ops["matcher"] += 1
+                posted = [group for group in await asyncio.gather(*posts, return_exceptions=True)
+                          if not isinstance(group, Exception)]
+                self.matched.extend(posted)
+                if not posted:
+                    break
+        finally:
+            current_op.reset(token)
+
+    async def scenario_reload(self, groups, players):
+        """Reload the handlers extension on a real, never connected bot and check that live state survives it."""
+        creators = [FakeMember(next(_ids)) for _ in range(groups)]
+        messages = [m for m in await asyncio.gather(*[
+            self.startdungeon(creator, self.random.choice(self.channels)) for creator in creators
+        ]) if m is not None]
+        pool = [FakeMember(next(_ids)) for _ in range(players)]
+        await asyncio.gather(*[self.click(self.random.choice(pool), message, "dps") for message in messages])
+
+        bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+        bot.blizzard = None
+        await bot.load_extension("handlers")
+        old = sys.modules["handlers"]
+        # discord.py keeps a view per message sent with one; those must stop answering too
+        for message in messages:
+            bot.add_view(old.GroupView(state.guild_configs.get(1)), message_id=message.id)
+
+        groups_before = {group.message_id: (group, frozenset(group.players)) for group in state.active_groups}
+        timers_before = len(state.timers)
+        start = time.perf_counter()
+        await bot.reload_extension("handlers")
+        self.reload_seconds = time.perf_counter() - start
+        new = sys.modules["handlers"]
+
+        errors = self.reload_errors
+        if new is old:
+            errors.append("reload did not re-import handlers")
+        groups_after = {group.message_id: group for group in state.active_groups}
+        if groups_after.keys() != groups_before.keys():
+            errors.append(f"reload changed the open groups ({len(groups_before)} before, {len(groups_after)} after)")
+        for message_id, (group, players) in groups_before.items():
+            if groups_after.get(message_id) is not group or group.players != players:
+                errors.append(f"group {message_id} was replaced or changed by the reload")
+        if len(state.timers) != timers_before:
+            errors.append(f"reload changed the pending timers ({timers_before} before, {len(state.timers)} after)")
+        views = bot.persistent_views
+        if len(views) != 1 or type(views[0]) is not new.GroupView:
+            errors.append(f"expected one listener from the reloaded GroupView, found {[type(v).__module__ for v in views]}")
+        cog = bot.get_cog("DungeonCommands")
+        if type(cog) is not new.DungeonCommands or bot.tree.get_command("startdungeon").binding is not cog:
+            errors.append("/startdungeon is not bound to the reloaded cog")
+
+        # A click on a group opened before the reload goes through the new view
+        open_groups = [state.active_groups.guild(1).get(message.id) for message in messages]
+        group = next((group for group in open_groups if group is not None and len(group.dps) < 3), None)
+        if views and group is not None:
+            user = FakeMember(next(_ids))
+            message = self.messages[group.message_id]
+            interaction = FakeInteraction(self.rest, user, message.channel, message)
+            await self.run_op("button.dps", lambda i: views[0].assign_role(i, "dps"), interaction)
+            if user.id not in group.players:
+                errors.append("a click after the reload did not join the group")
+        await bot.unload_extension("handlers")
+
+    def check_invariants(self) -> list:
+        errors = list(self.reload_errors)
+        seen = set()
+        for group in self.matched:
+            roster = [group.tank, group.healer] + group.dps
+            if None in roster or len(group.dps) != 3 or len(set(roster)) != 5:
+                errors.append(f"matched group {group.message_id} is not one tank, one healer and three DPS")
+            for user_id in roster:
+                if user_id in seen:
+                    errors.append(f"player {user_id} was matched into more than one group")
+                seen.add(user_id)
+                role, low, high, dungeons = self.queued[user_id]
+                if group.role_of(user_id) != role or not low <= group.key_level <= high:
+                    errors.append(f"player {user_id} was matched outside their role or key range")
+                if dungeons and group.dungeon not in dungeons:
+                    errors.append(f"player {user_id} was matched into a dungeon they did not pick")
+        for message_id, count in self.ready.items():
+            if count != 1:
+                errors.append(f"group {message_id} was announced {count} times")
+        completed = sum(
+            totals[0] for guild in state.group_history.stats.guilds.values() for totals in guild["dungeons"].values()
+        )
+        if completed != len(self.ready) + len(self.matched):
+            errors.append(f"history counts {completed} completed groups, expected {len(self.ready) + len(self.matched)}")
+        for group in state.active_groups:
+            if len(group.dps) > 3:
+                errors.append(f"group {group.message_id} has {len(group.dps)} DPS")
+            roster = [user for user in (group.tank, group.healer) if user is not None] + group.dps
+            if len(roster) != len(set(roster)) or set(roster) != group.players:
+                errors.append(f"group {group.message_id} roster does not match its players")
+            if group.is_full():
+                errors.append(f"group {group.message_id} is full but still active")
+        return errors
+
+    def report(self, peak_memory, elapsed) -> str:
+        calls = self.rest.calls_by_op()
+        lines = [
+            f"{'operation':<22}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'ack p50':>10}{'ack p99':>10}{'REST/op':>10}",
+        ]
+        for op in sorted(self.ops):
+            lines.append(
+                f"{op:<22}{self.ops[op]:>8}"
+                f"{percentile(self.latencies[op], 50) * 1000:>10.2f}{percentile(self.latencies[op], 99) * 1000:>10.2f}"
+                f"{percentile(self.acks[op], 50) * 1000:>10.2f}{percentile(self.acks[op], 99) * 1000:>10.2f}"
+                f"{calls[op] / self.ops[op]:>10.2f}"
+            )
+        if calls.get("background"):
+            lines.append(f"{'background':<22}{calls['background']:>8} REST calls")
+        routes = defaultdict(int)
+        for (_, route), count in self.rest.calls.items():
+            routes[route] += count
+        lines.append("")
+        lines.append("REST calls by route: " + ", ".join(f"{route}={count}" for route, count in sorted(routes.items())))
+        if self.rest.rate_limits:
+            lines.append("429s by route: " + ", ".join(f"{route}={count}" for route, count in sorted(self.rest.rate_limits.items())))
+        lines.append(f"Ready announcements: {sum(self.ready.values())}, still active: {len(state.active_groups)}")
+        if self.queued:
+            still_queued = sum(len(queue) for queue in state.match_queues.values())
+            lines.append(f"Matched groups: {len(self.matched)} from {len(self.queued)} queued players, still queued: {still_queued}")
+        if self.latencies["click.memory"] and self.latencies["click.sqlite"]:
+            def overhead(samples, pct):
+                return percentile(samples["click.sqlite"], pct) / percentile(samples["click.memory"], pct) - 1
+            lines.append(
+                f"Persistence overhead on clicks: handler p50 {overhead(self.latencies, 50):+.1%}, p99 {overhead(self.latencies, 99):+.1%}; "
+                f"ack p50 {overhead(self.acks, 50):+.1%}, p99 {overhead(self.acks, 99):+.1%}"
+            )
+        if self.reload_seconds is not None:
+            lines.append(f"Reload: {self.reload_seconds * 1000:.1f} ms with {len(state.active_groups)} open groups kept")
+        if peak_memory is None:
+            lines.append(f"Wall time: {elapsed:.2f}s")
+        else:
+            lines.append(f"Peak memory: {peak_memory / 1024 / 1024:.1f} MiB, wall time: {elapsed:.2f}s")
+        return "\n".join(lines)
+
+
+async def bench_instrumentation(iterations=200000) -> str:
+    """Cost of the metrics wrapper around a handler that does nothing."""
+    async def handler():
+        pass
+
+    wrapped = metrics.instrumented("loadtest.noop")(handler)
+    timings = {}
+    for name, func in (("plain", handler), ("instrumented", wrapped)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        timings[name] = (time.perf_counter() - start) / iterations
+    overhead = timings["instrumented"] - timings["plain"]
+    return f"Instrumentation overhead: {overhead * 1e9:.0f} ns per handler call ({iterations} calls)"
+
+
+def bench_matchmaking(players=5000, seed=None, budget=None) -> str:
+    """One matcher pass over a queue of random players, with no Discord calls."""
+    rng = random.Random(seed)
+    dungeons = [f"Dungeon {i}" for i in range(8)]
+    queue = MatchQueue()
+    for user_id in range(players):
+        low = rng.randint(2, 16)
+        queue.add(QueueEntry(
+            user_id, f"Player{user_id}", rng.choice(["tank", "healer", "dps", "dps", "dps"]), low, low + rng.randint(0, 4),
+            rng.sample(dungeons, rng.choice([0, 0, 1, 2, 3]))
+        ))
+
+    start = time.perf_counter()
+    matches = queue.match(deadline=None if budget is None else start + budget)
+    elapsed = time.perf_counter() - start
+    return (
+        f"Matchmaking: {len(matches)} groups from {players} queued players in {elapsed * 1000:.1f} ms "
+        f"({elapsed / players * 1e6:.2f} us per player), {len(queue)} left waiting"
+    )
+
+
+def member_payload(user_id) -> dict:
+    """The member object Discord sends with an interaction in a guild."""
+    return {
+        "user": {"id": str(user_id), "username": f"player{user_id}", "global_name": f"Player {user_id}",
+                 "discriminator": "0", "avatar": "0" * 32, "public_flags": 0},
+        "roles": [str(next(_ids)), str(next(_ids))], "joined_at": "2024-01-01T00:00:00+00:00", "nick": None,
+        "flags": 0, "permissions": "2248473465835073", "avatar": None, "pending": False, "deaf": False, "mute": False,
+    }
+
+
+def bench_memory(groups=1000) -> str:
+    """Bytes each open group keeps alive: the original dicts of discord.Member objects against Group records.
+
+    Members are real discord.Member objects built from interaction payloads and dropped once
+    the groups are built, as they are when the interaction ends. Without the members intent
+    discord.py caches neither members nor users, so whatever a group still references is
+    counted against it: the whole Member for the dicts, the display name string for Groups.
+    """
+    connection = SimpleNamespace()
+    connection.store_user = lambda data: discord.User(state=connection, data=data)
+    roles = ["tank", "healer", "dps", "dps", "dps"]
+
+    def as_dicts():
+        kept = []
+        for _ in range(groups):
+            members = [discord.Member(data=member_payload(next(_ids)), guild=None, state=connection) for _ in roles]
+            group = {"dungeon": "Darkflame Cleft", "key_level": 12, "tank": members[0], "healer": members[1],
+                     "dps": members[2:], "players": set(members), "creator": members[0], "start_time": datetime.now()}
+            group["message_id"] = next(_ids)
+            group["channel_id"] = next(_ids)
+            kept.append(group)
+        return kept
+
+    def as_groups(register=False):
+        registry = GroupRegistry()
+        kept = [registry]
+        for _ in range(groups):
+            members = [discord.Member(data=member_payload(next(_ids)), guild=None, state=connection) for _ in roles]
+            group = Group("Darkflame Cleft", 12, members[0].id, datetime.now(), guild_id=1)
+            for member, role in zip(members, roles):
+                registry.join(group, member.id, role, member.display_name)
+            group.message_id = next(_ids)
+            group.channel_id = next(_ids)
+            if register:
+                registry.add(group)
+            kept.append(group)
+        return kept
+
+    def retained(build) -> float:
+        gc.collect()
+        tracemalloc.start()
+        kept = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+        return size / groups
+
+    dicts = retained(as_dicts)
+    records = retained(as_groups)
+    registered = retained(lambda: as_groups(register=True))
+    return (
+        f"Memory per open group ({groups} groups of 5 players, Members dropped after each interaction):\n"
+        f"  dict of discord.Member (original): {dicts:.0f} B\n"
+        f"  Group record: {records:.0f} B ({records / dicts:.0%})\n"
+        f"  Group in a GroupRegistry, with its indexes and shared names: {registered:.0f} B ({registered / dicts:.0%})"
+    )
+
+
+async def main(args) -> int:
+    if args.scenario == "overhead":
+        print(await bench_instrumentation())
+        return 0
+    if args.scenario == "matchmaking":
+        print(bench_matchmaking(args.queued, args.seed))
+        print(bench_matchmaking(args.queued, args.seed, budget=handlers.MATCH_BUDGET))
+        return 0
+    if args.scenario == "memory":
+        print(bench_memory(args.groups))
+        return 0
+
+    rest = FakeRest(args.latency, args.jitter, args.bucket_limit, args.bucket_window, args.seed, args.connections)
+    outbound.enabled = not args.no_outbound_scheduler
+    state.embed_updates.window = args.window
+    if args.ping_digest:
+        state.guild_configs.default.ping_digest = True
+        state.ping_digest.interval = args.ping_digest
+    state.group_store.open()
+    state.group_store.start()
+    state.group_history.open()
+    state.group_history.start()
+    state.timers.start()
+    test = LoadTest(rest, channels=args.channels, concurrency=args.concurrency, seed=args.seed)
+
+    # tracemalloc slows every allocation, which skews a latency comparison; the persistence run goes without it
+    traced = args.scenario != "persistence"
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if args.scenario in ("lifecycle", "all"):
+        await test.scenario_lifecycle(args.groups, args.players)
+    if args.scenario in ("stress", "all"):
+        await test.scenario_stress(max(1, args.groups // 10), args.clicks, args.players)
+    if args.scenario == "spike":
+        await test.scenario_spike(args.groups, args.edits, args.clicks // 5)
+    if args.scenario in ("queue", "all"):
+        await test.scenario_queue(args.queued)
+    if args.scenario == "persistence":
+        await test.scenario_persistence(max(1, args.groups // 10), args.clicks, args.players)
+    if args.scenario in ("reload", "all"):
+        await test.scenario_reload(max(1, args.groups // 10), args.players)
+    # Let coalesced embed edits and digest refreshes drain so they are counted
+    await asyncio.sleep(max(args.window * 2, args.ping_digest * 2) + args.latency * 4)
+    await outbound.drain()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if traced:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    await state.timers.close()
+    await state.group_store.close()
+    await state.group_history.close()
+
+    print(test.report(peak, elapsed))
+    errors = test.check_invariants()
+    for error in errors:
+        print(f"❌ {error}")
+    return 1 if errors else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the M+ group handlers")
+    parser.add_argument("--scenario", choices=["lifecycle", "stress", "queue", "spike", "persistence", "reload", "all", "overhead", "matchmaking", "memory"], default="all")
+    parser.add_argument("--groups", type=int, default=200, help="Groups to create")
+    parser.add_argument("--players", type=int, default=1000, help="Distinct players clicking buttons")
+    parser.add_argument("--clicks", type=int, default=5000, help="Concurrent clicks in the stress scenario")
+    parser.add_argument("--queued", type=int, default=1000, help="Players joining the matchmaking queue")
+    parser.add_argument("--edits", type=int, default=5000, help="Deferrable embed edits fired in the spike scenario")
+    parser.add_argument("--connections", type=int, default=0, help="Shared connections for all REST calls (0 = unlimited)")
+    parser.add_argument("--no-outbound-scheduler", action="store_true", help="Send background calls directly, for comparison")
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=200, help="Interactions in flight at once")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per simulated REST call")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--bucket-limit", type=int, default=5, help="Calls per channel bucket window before a 429")
+    parser.add_argument("--bucket-window", type=float, default=5.0)
+    parser.add_argument("--window", type=float, default=1.0, help="Embed update coalescing window")
+    parser.add_argument("--ping-digest", type=float, default=0, metavar="SECONDS",
+                        help="Use per-channel role-ping digests refreshed this often instead of a ping per group")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,82 @@
+# log_setup.py
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Set for the duration of each command or button handler (and inherited by tasks it starts),
+# so every line logged while handling one interaction carries its ID
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra= and goes into the JSON
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sample"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, correlation ID and any extra fields."""
+
+    def format(self, record) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _EventLoopQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting them.
+
+    The stock QueueHandler formats on the calling thread; here the caller only stamps the
+    correlation ID, applies sampling and merges the message arguments, so a slow stdout
+    never blocks the event loop and JSON encoding happens on the listener thread.
+    """
+
+    def emit(self, record):
+        sample = getattr(record, "sample", None)
+        if sample is not None and random.random() >= sample:
+            return
+        super().emit(record)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if getattr(record, "correlation_id", None) is None:
+            record.correlation_id = correlation_id.get()
+        if getattr(record, "sample", None) is not None:
+            record.sample_rate = record.sample
+        return record
+
+
+def setup_logging(level: str = "INFO", stream=None) -> logging.handlers.QueueListener:
+    """Route all logging through an in-memory queue to a JSON writer thread. Returns the running listener.
+
+    High-volume events can pass extra={"sample": 0.01} to keep only that fraction of them.
+    """
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = _EventLoopQueueHandler(records)
+    handler.setLevel(level.upper())  # Also applies to loggers set lower than the root, like discord.http for the 429 counter
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    listener.start()
+    return listener
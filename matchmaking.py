@@ -0,0 +1,185 @@
+# matchmaking.py
+import bisect
+import time
+
+MIN_KEY_LEVEL = 0
+MAX_KEY_LEVEL = 20
+GROUP_SLOTS = {"tank": 1, "healer": 1, "dps": 3}
+
+
+class QueueEntry:
+    """One player waiting for a group: their role, the key levels they accept and any dungeon preferences."""
+    __slots__ = ("user_id", "name", "role", "min_level", "max_level", "dungeons", "channel_id", "queued_at")
+
+    def __init__(self, user_id, name, role, min_level, max_level, dungeons=None, channel_id=None, queued_at=None):
+        self.user_id = user_id
+        self.name = name
+        self.role = role
+        self.min_level = max(MIN_KEY_LEVEL, min_level)
+        self.max_level = min(MAX_KEY_LEVEL, max_level)
+        self.dungeons = frozenset(dungeons) if dungeons else None  # None means any dungeon
+        self.channel_id = channel_id
+        self.queued_at = time.time() if queued_at is None else queued_at
+
+
+class Match:
+    __slots__ = ("key_level", "dungeons", "members")
+
+    def __init__(self, key_level, dungeons, members):
+        self.key_level = key_level
+        self.dungeons = dungeons  # Dungeons every member accepts, or None for any
+        self.members = members  # Tank, healer, then DPS
+
+
+def _narrow(allowed, dungeons):
+    """Dungeons acceptable to both sides. None means any; an empty set means no overlap."""
+    if allowed is None:
+        return dungeons
+    if dungeons is None:
+        return allowed
+    return allowed & dungeons
+
+
+def _in_queue_order(entries: dict) -> dict:
+    return dict(sorted(entries.items(), key=lambda item: item[1].queued_at))
+
+
+class MatchQueue:
+    """Players queued in one guild, bucketed by role and by every key level they accept.
+
+    Each entry sits in one bucket per level in its range, so finding a healer or three
+    DPS for a given key is a dict lookup rather than a scan of the whole queue. Buckets
+    keep queue order, so the longest-waiting compatible players are picked first.
+    """
+
+    def __init__(self):
+        self.entries = {}  # user ID -> QueueEntry, in queue order
+        self.by_role = {role: {} for role in GROUP_SLOTS}  # role -> {user ID: entry}
+        self.buckets = {role: [{} for _ in range(MAX_KEY_LEVEL + 1)] for role in GROUP_SLOTS}
+        self._resume = None  # queued_at of the anchor the last pass ran out of time on
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, user_id):
+        return user_id in self.entries
+
+    def get(self, user_id):
+        return self.entries.get(user_id)
+
+    def add(self, entry: QueueEntry):
+        """Queue a player, replacing their previous entry if they were already queued."""
+        self.remove(entry.user_id)
+        self.entries[entry.user_id] = entry
+        self.by_role[entry.role][entry.user_id] = entry
+        buckets = self.buckets[entry.role]
+        for level in range(entry.min_level, entry.max_level + 1):
+            buckets[level][entry.user_id] = entry
+
+    def remove(self, user_id):
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return None
+        del self.by_role[entry.role][user_id]
+        buckets = self.buckets[entry.role]
+        for level in range(entry.min_level, entry.max_level + 1):
+            del buckets[level][user_id]
+        return entry
+
+    def restore(self, entries) -> list:
+        """Put players back at their original place in line, e.g. when their group could not be posted.
+
+        Anyone who queued again in the meantime keeps their new entry. Returns the entries put back.
+        """
+        restored = [entry for entry in entries if entry.user_id not in self.entries]
+        if not restored:
+            return restored
+        for entry in restored:
+            self.add(entry)
+        # add() puts them at the back; sort by queued_at so they are matched first and expire() still sees queue order
+        self.entries = _in_queue_order(self.entries)
+        for role in {entry.role for entry in restored}:
+            self.by_role[role] = _in_queue_order(self.by_role[role])
+            buckets = self.buckets[role]
+            levels = {level for entry in restored if entry.role == role
+                      for level in range(entry.min_level, entry.max_level + 1)}
+            for level in levels:
+                buckets[level] = _in_queue_order(buckets[level])
+        return restored
+
+    def expire(self, queued_before: float) -> list:
+        """Drop entries queued before the given time. Entries are in queue order, so this stops at the first newer one."""
+        expired = []
+        for entry in list(self.entries.values()):
+            if entry.queued_at >= queued_before:
+                break
+            expired.append(self.remove(entry.user_id))
+        return expired
+
+    def match(self, deadline: float = None, max_scan: int = 50) -> list:
+        """Greedily form complete groups and remove their players from the queue.
+
+        Anchors on the scarcest role in queue order and tries each key level the anchor
+        accepts, highest first. At most max_scan candidates are examined per bucket, and
+        the pass stops once time.perf_counter() passes deadline; the next pass resumes
+        from that anchor and wraps around, so anchors at the front that can't be matched
+        don't use up the budget every tick.
+        """
+        anchor_role = min(GROUP_SLOTS, key=lambda role: len(self.by_role[role]) / GROUP_SLOTS[role])
+        if any(len(self.by_role[role]) < slots for role, slots in GROUP_SLOTS.items()):
+            return []
+
+        anchors = list(self.by_role[anchor_role].values())
+        start = 0
+        if self._resume is not None:
+            start = bisect.bisect_left(anchors, self._resume, key=lambda entry: entry.queued_at)
+            self._resume = None
+        matches = []
+        for anchor in anchors[start:] + anchors[:start]:
+            if deadline is not None and time.perf_counter() > deadline:
+                self._resume = anchor.queued_at
+                break
+            if anchor.user_id not in self.entries:
+                continue
+            match = self._fill(anchor, max_scan)
+            if match is None:
+                continue
+            for member in match.members:
+                self.remove(member.user_id)
+            matches.append(match)
+            if any(len(self.by_role[role]) < slots for role, slots in GROUP_SLOTS.items()):
+                break
+        return matches
+
+    def _fill(self, anchor: QueueEntry, max_scan: int):
+        for level in range(anchor.max_level, anchor.min_level - 1, -1):
+            # Cheap size check before looking at anyone
+            if any(len(self.buckets[role][level]) < slots for role, slots in GROUP_SLOTS.items()):
+                continue
+
+            allowed = anchor.dungeons
+            picked = {role: [] for role in GROUP_SLOTS}
+            picked[anchor.role].append(anchor)
+            for role, slots in GROUP_SLOTS.items():
+                chosen = picked[role]
+                if len(chosen) == slots:
+                    continue
+                scanned = 0
+                for entry in self.buckets[role][level].values():
+                    if entry is anchor:
+                        continue
+                    scanned += 1
+                    if scanned > max_scan:
+                        break
+                    narrowed = _narrow(allowed, entry.dungeons)
+                    if narrowed is not None and not narrowed:
+                        continue
+                    allowed = narrowed
+                    chosen.append(entry)
+                    if len(chosen) == slots:
+                        break
+                if len(chosen) < slots:
+                    break
+            else:
+                return Match(level, allowed, picked["tank"] + picked["healer"] + picked["dps"])
+        return None
@@ -0,0 +1,246 @@
+# metrics.py
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from aiohttp import web
+from log_setup import correlation_id
+
+# Everything here runs on the event loop thread, so plain ints and floats are enough:
+# no locks, and an observation is a bisect plus two additions.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0)
+
+REGISTRY = {}  # name -> metric; re-registering a name replaces the old metric
+current_route = contextvars.ContextVar("current_route", default="unknown")
+
+log = logging.getLogger(__name__)
+handlers_in_flight = 0  # Interaction handlers currently running; each owes Discord a response
+HANDLER_LOG_SAMPLE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))  # Fraction of handler completions that get a log line
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        REGISTRY[name] = self
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback at scrape time, so the hot path never updates it."""
+
+    def __init__(self, name: str, help: str, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        REGISTRY[name] = self
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.fn()}"]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        REGISTRY[name] = self
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Time spent in command and button handlers", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised", ("handler",))
+FIRST_RESPONSE_SECONDS = Histogram(
+    "bot_first_response_seconds", "Time from interaction creation to its first response (Discord allows 3s)", ("handler",)
+)
+DISCORD_REQUEST_SECONDS = Histogram("discord_request_seconds", "Outbound Discord REST calls", ("route",))
+DISCORD_RATE_LIMITS = Counter("discord_rate_limited_total", "429 responses from Discord", ("route",))
+DISCORD_GLOBAL_RATE_LIMITS = Counter("discord_global_rate_limited_total", "429 responses that hit the global rate limit")
+BLIZZARD_REQUEST_SECONDS = Histogram("blizzard_request_seconds", "Outbound Blizzard API calls", ("endpoint",))
+BLIZZARD_REQUEST_ERRORS = Counter("blizzard_request_errors_total", "Failed Blizzard API calls", ("endpoint",))
+
+
+Gauge("bot_handlers_in_flight", "Interaction handlers currently running", lambda: handlers_in_flight)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _interaction_id(args):
+    # Commands and buttons get (self, interaction, ...), plain tree commands get (interaction, ...)
+    for arg in args[:2]:
+        if hasattr(arg, "response") and hasattr(arg, "id"):
+            return arg.id
+    return None
+
+
+def instrumented(name: str):
+    """Time an async command or button callback under the given handler name.
+
+    Also tags everything logged while it runs with the interaction's ID.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            global handlers_in_flight
+            token = correlation_id.set(_interaction_id(args))
+            handlers_in_flight += 1
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+            finally:
+                handlers_in_flight -= 1
+                elapsed = time.perf_counter() - start
+                HANDLER_SECONDS.observe(elapsed, name)
+                # Sample before building the record; at full rate this line would dominate the log
+                if random.random() < HANDLER_LOG_SAMPLE and log.isEnabledFor(logging.INFO):
+                    log.info("Handled %s", name, extra={"handler": name, "seconds": round(elapsed, 6), "sample_rate": HANDLER_LOG_SAMPLE})
+                correlation_id.reset(token)
+        return wrapper
+    return decorator
+
+
+class _RateLimitCounter(logging.Handler):
+    """discord.py retries 429s internally and only logs them, so count them from the log.
+
+    Matches the message templates discord.py logs for a 429 on a route or webhook, and the
+    extra line it logs when the 429 was the global limit.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+
+    def emit(self, record):
+        msg = record.msg
+        if not isinstance(msg, str):
+            return
+        if "responded with 429" in msg or "is rate limited" in msg:
+            DISCORD_RATE_LIMITS.inc(current_route.get())
+        elif msg.startswith("Global rate limit has been hit"):
+            DISCORD_GLOBAL_RATE_LIMITS.inc()
+
+
+def _timed_request(request):
+    @functools.wraps(request)
+    async def wrapper(self, route, *args, **kwargs):
+        token = current_route.set(route.key)
+        start = time.perf_counter()
+        try:
+            return await request(self, route, *args, **kwargs)
+        finally:
+            DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - start, route.key)
+            current_route.reset(token)
+    return wrapper
+
+
+def _timed_first_response(respond):
+    @functools.wraps(respond)
+    async def wrapper(self, *args, **kwargs):
+        result = await respond(self, *args, **kwargs)
+        interaction = self._parent
+        if interaction.command is not None:
+            handler = interaction.command.name
+        else:
+            handler = (interaction.data or {}).get("custom_id", "unknown")
+        FIRST_RESPONSE_SECONDS.observe((datetime.now(timezone.utc) - interaction.created_at).total_seconds(), handler)
+        return result
+    return wrapper
+
+
+_installed = False
+
+
+def install_discord_hooks():
+    """Time every Discord REST call and interaction response, and count 429s per route."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    import discord
+    from discord.http import HTTPClient
+    from discord.webhook.async_ import AsyncWebhookAdapter
+
+    HTTPClient.request = _timed_request(HTTPClient.request)
+    AsyncWebhookAdapter.request = _timed_request(AsyncWebhookAdapter.request)
+    for method in ("defer", "send_message", "edit_message", "send_modal", "autocomplete"):
+        setattr(discord.InteractionResponse, method, _timed_first_response(getattr(discord.InteractionResponse, method)))
+
+    counter = _RateLimitCounter()
+    for name in ("discord.http", "discord.webhook.async_"):
+        logger = logging.getLogger(name)
+        logger.addHandler(counter)
+        # The 429 warnings must be created even when LOG_LEVEL is above WARNING; the log output still filters by level
+        if not logger.isEnabledFor(logging.WARNING):
+            logger.setLevel(logging.WARNING)
+
+
+async def serve(host: str = "127.0.0.1", port: int = 9108) -> web.AppRunner:
+    """Expose /metrics in Prometheus text format. Returns the runner so the caller can clean it up."""
+    async def handle(request):
+        return web.Response(text=render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,123 @@
+# ping_digest.py
+import asyncio
+import logging
+import discord
+from rest_scheduler import DEFERRABLE, NORMAL, outbound
+
+log = logging.getLogger(__name__)
+
+
+class _Digest:
+    __slots__ = ("channel", "guild_id", "render", "message", "pinged", "dirty", "task")
+
+    def __init__(self, channel, guild_id):
+        self.channel = channel
+        self.guild_id = guild_id
+        self.render = None
+        self.message = None  # The digest currently posted in the channel
+        self.pinged = frozenset()  # Roles listed in that message
+        self.dirty = False
+        self.task = None
+
+
+class PingDigest:
+    """One "groups needing roles" message per channel instead of a role ping per group.
+
+    Changes only mark the channel dirty; at most once per interval the digest is
+    re-rendered and edited in place. Edits never notify anyone, so when a role shows up
+    that the current message does not list, a fresh digest is posted (pinging it) and
+    the old one is deleted. When nothing is needed any more the digest is removed.
+
+    With a store, each channel's digest message is saved, so after a restart restore()
+    picks it up again instead of leaving it behind and pinging everyone in a new one.
+    """
+
+    def __init__(self, interval: float = 15.0, store=None):
+        self.interval = interval
+        self.store = store  # A GroupStore, or None to keep digests in memory only
+        self._digests = {}  # channel ID -> _Digest
+
+    def restore(self, channel, guild_id, message_id, roles):
+        """Adopt a digest posted before a restart. It is edited, reposted or deleted at its next refresh."""
+        digest = self._digests[channel.id] = _Digest(channel, guild_id)
+        digest.message = channel.get_partial_message(message_id)
+        digest.pinged = frozenset(roles)
+
+    def mark(self, channel, guild_id, render):
+        """Queue a refresh. render() returns the content and the set of roles still needed."""
+        digest = self._digests.get(channel.id)
+        if digest is None:
+            digest = self._digests[channel.id] = _Digest(channel, guild_id)
+        digest.render = render
+        digest.dirty = True
+        if digest.task is None:
+            digest.task = asyncio.create_task(self._run(channel.id, digest))
+
+    async def close(self):
+        tasks = [digest.task for digest in self._digests.values() if digest.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, channel_id, digest):
+        try:
+            while digest.dirty:
+                await asyncio.sleep(self.interval)
+                digest.dirty = False
+                try:
+                    await self._flush(digest)
+                except Exception:
+                    log.exception("Error updating role ping digest", extra={"channel_id": channel_id})
+        finally:
+            digest.task = None
+            if digest.message is None and self._digests.get(channel_id) is digest:
+                del self._digests[channel_id]
+
+    async def _flush(self, digest):
+        content, roles = digest.render()
+        old = digest.message
+        if not roles:
+            digest.message = None
+            digest.pinged = frozenset()
+            if old is not None:
+                await self._save(digest)
+                try:
+                    await outbound.call(DEFERRABLE, ("channel", digest.channel.id), old.delete)
+                except discord.NotFound:
+                    pass  # Already gone
+            return
+
+        if old is not None and not roles - digest.pinged:
+            try:
+                await outbound.call(
+                    DEFERRABLE, ("channel", digest.channel.id),
+                    lambda: old.edit(content=content, allowed_mentions=discord.AllowedMentions.none()),
+                    merge_key=("edit", old.id)
+                )
+                if roles != digest.pinged:
+                    digest.pinged = roles
+                    await self._save(digest)
+                return
+            except discord.NotFound:
+                old = digest.message = None  # Someone deleted the digest; post a new one
+
+        # A newly needed role has to be pinged, and only a new message does that
+        digest.message = await outbound.call(
+            NORMAL, ("channel", digest.channel.id),
+            lambda: digest.channel.send(content, allowed_mentions=discord.AllowedMentions(roles=True))
+        )
+        digest.pinged = roles
+        await self._save(digest)
+        if old is not None:
+            try:
+                await outbound.call(DEFERRABLE, ("channel", digest.channel.id), old.delete)
+            except discord.NotFound:
+                pass
+
+    async def _save(self, digest):
+        if self.store is None:
+            return
+        if digest.message is None:
+            await self.store.delete_digest(digest.channel.id)
+        else:
+            await self.store.save_digest(digest.channel.id, digest.guild_id, digest.message.id, digest.pinged)
@@ -0,0 +1,70 @@
+# renderer.py
+import discord
+from datetime import datetime, timedelta
+from group_registry import Group
+
+ONE_MINUTE = timedelta(minutes=1)
+
+
+class GroupRenderer:
+    """Builds group status embeds, reusing the last one until the group changes.
+
+    Each group carries a version that the registry bumps on every join and leave. The
+    rendered embed is kept on the group keyed by that version (plus whether the start
+    time is still shown), so refreshes, reminders and recovery that render an unchanged
+    group get the cached embed back.
+    """
+
+    def __init__(self, role_icons: dict):
+        # Field names never change, so build them once
+        self.tank_field = f"{role_icons['tank']} Tank"
+        self.healer_field = f"{role_icons['healer']} Healer"
+        self.dps_icon = role_icons['dps']
+        self.dps_fields = [f"{self.dps_icon} DPS ({count}/3)" for count in range(4)]
+
+    def render(self, group: Group, expired: bool = False) -> discord.Embed:
+        # Show the start time only while it is more than a minute away
+        show_start = not expired and datetime.now() < group.start_time - ONE_MINUTE
+        key = (group.version, show_start, expired)
+        cached = group.render_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        embed = self._build(group, show_start, expired)
+        group.render_cache = (key, embed)
+        return embed
+
+    def _build(self, group: Group, show_start: bool, expired: bool) -> discord.Embed:
+        status = discord.Embed(
+            title=f"{group.dungeon} +{group.key_level}" + (" (Expired)" if expired else ""),
+            color=discord.Color.dark_grey() if expired else discord.Color.blue()
+        )
+
+        if show_start:
+            status.add_field(
+                name="⏰ Start Time",
+                value=f"**{group.start_time.strftime('%H:%M')}**",
+                inline=False
+            )
+
+        # Tank status
+        tank = self._player(group, group.tank) if group.tank else "❌ Not filled"
+        status.add_field(name=self.tank_field, value=tank, inline=False)
+
+        # Healer status
+        healer = self._player(group, group.healer) if group.healer else "❌ Not filled"
+        status.add_field(name=self.healer_field, value=healer, inline=False)
+
+        # DPS status
+        dps_list = "\n".join([self._player(group, dps) for dps in group.dps]) or "❌ No DPS signed up"
+        status.add_field(name=self.dps_fields[len(group.dps)], value=dps_list, inline=False)
+
+        # Add group creator
+        status.set_footer(text=f"Created by {group.name(group.creator)}")
+
+        return status
+
+    @staticmethod
+    def _player(group: Group, user_id: int) -> str:
+        profile = group.profile(user_id)
+        return f"✅ {group.name(user_id)} · {profile}" if profile else f"✅ {group.name(user_id)}"
@@ -0,0 +1,170 @@
+# rest_scheduler.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+# Priority classes, most urgent first. Interaction responses (acks) are never queued; the
+# others wait for a slot, and deferrable calls also step aside while handlers are answering.
+ACK = 0
+URGENT = 1
+NORMAL = 2
+DEFERRABLE = 3
+PRIORITY_NAMES = ("ack", "urgent", "normal", "deferrable")
+
+log = logging.getLogger(__name__)
+
+OUTBOUND_WAIT_SECONDS = Histogram(
+    "discord_outbound_wait_seconds", "Time Discord calls spent queued before being sent", ("priority",)
+)
+OUTBOUND_MERGED = Counter("discord_outbound_merged_total", "Queued calls replaced by a newer call to the same target", ("priority",))
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "bucket", "request", "merge_key", "future", "queued_at", "context")
+
+    def __init__(self, priority, seq, bucket, request, merge_key):
+        self.priority = priority
+        self.seq = seq
+        self.bucket = bucket
+        self.request = request
+        self.merge_key = merge_key
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.perf_counter()
+        self.context = contextvars.copy_context()  # Run in the caller's context, e.g. its correlation ID
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundScheduler:
+    """Orders the bot's own Discord calls by urgency so interaction acks never queue behind edits.
+
+    Background calls (announcements, embed edits, deletes) are queued by priority, at most
+    max_in_flight of them run at once, and calls for the same rate-limit bucket run one at a
+    time so a 429 on one channel holds a single slot instead of several. Deferrable calls
+    with a merge key replace any queued call with the same key, so a burst of edits to one
+    message sends only the latest. While ack_pressure or more interaction handlers are
+    running (and so owe Discord a response), deferrable calls are held back, for up to
+    max_defer seconds each so a steady stream of clicks can't starve them.
+    """
+
+    def __init__(self, max_in_flight: int = 8, ack_pressure: int = 4, max_defer: float = 2.0):
+        self.max_in_flight = max_in_flight
+        self.ack_pressure = ack_pressure
+        self.max_defer = max_defer
+        self.enabled = True  # False sends everything straight away, e.g. to compare in the load test
+        self._heap = []
+        self._seq = itertools.count()
+        self._merge = {}  # merge key -> queued _Job
+        self._blocked = {}  # bucket -> jobs waiting for that bucket to free up
+        self._busy = set()  # buckets with a call in flight
+        self._running = 0
+        self._tasks = set()
+        self._submitted = set()  # Fire-and-forget calls from submit()
+        self._held = False  # A re-check is scheduled while deferrable calls are held back
+        self._depth = [0] * len(PRIORITY_NAMES)
+
+    def depth(self, priority: int) -> int:
+        return self._depth[priority]
+
+    async def drain(self):
+        """Wait until every queued call has been sent, e.g. before shutting down."""
+        while self._tasks or self._heap or self._submitted:
+            if self._tasks or self._submitted:
+                await asyncio.wait(self._tasks | self._submitted)
+            else:
+                await asyncio.sleep(0.05)  # Only held-back deferrable calls are left
+
+    async def call(self, priority: int, bucket, request, merge_key=None):
+        """Queue request() (a coroutine factory) and return its result once it has been sent."""
+        if not self.enabled or priority == ACK:
+            return await request()
+
+        if merge_key is not None:
+            queued = self._merge.get(merge_key)
+            if queued is not None:
+                # Not sent yet: send the newer call in its place and share the result
+                queued.request = request
+                OUTBOUND_MERGED.inc(PRIORITY_NAMES[queued.priority])
+                return await asyncio.shield(queued.future)
+
+        job = _Job(priority, next(self._seq), bucket, request, merge_key)
+        if merge_key is not None:
+            self._merge[merge_key] = job
+        self._depth[priority] += 1
+        heapq.heappush(self._heap, job)
+        self._pump()
+        return await asyncio.shield(job.future)
+
+    def submit(self, priority: int, bucket, request, merge_key=None):
+        """Queue request() without waiting for it; failures are logged.
+
+        For handlers, which must not sit on a deferrable call that is held back because handlers are running.
+        """
+        task = asyncio.create_task(self.call(priority, bucket, request, merge_key))
+        self._submitted.add(task)
+        task.add_done_callback(self._submit_done)
+
+    def _submit_done(self, task):
+        self._submitted.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Background Discord call failed", exc_info=task.exception())
+
+    def _pump(self):
+        while self._heap and self._running < self.max_in_flight:
+            job = self._heap[0]
+            if (job.priority == DEFERRABLE and metrics.handlers_in_flight >= self.ack_pressure
+                    and time.perf_counter() - job.queued_at < self.max_defer):
+                # Everything left is deferrable; look again once the handlers have had a moment
+                if not self._held:
+                    self._held = True
+                    asyncio.get_running_loop().call_later(0.05, self._release)
+                return
+            heapq.heappop(self._heap)
+            if job.bucket in self._busy:
+                self._blocked.setdefault(job.bucket, []).append(job)
+                continue
+            self._start(job)
+
+    def _release(self):
+        self._held = False
+        self._pump()
+
+    def _start(self, job):
+        if job.merge_key is not None and self._merge.get(job.merge_key) is job:
+            del self._merge[job.merge_key]
+        self._depth[job.priority] -= 1
+        self._busy.add(job.bucket)
+        self._running += 1
+        OUTBOUND_WAIT_SECONDS.observe(time.perf_counter() - job.queued_at, PRIORITY_NAMES[job.priority])
+        task = job.context.run(asyncio.create_task, self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job):
+        try:
+            result = await job.request()
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        finally:
+            self._running -= 1
+            self._busy.discard(job.bucket)
+            for waiting in self._blocked.pop(job.bucket, ()):
+                heapq.heappush(self._heap, waiting)
+            self._pump()
+
+
+outbound = OutboundScheduler()
+
+for _priority, _name in enumerate(PRIORITY_NAMES[1:], start=1):
+    Gauge(f"discord_outbound_queue_depth_{_name}", f"Queued {_name} Discord calls", lambda p=_priority: outbound.depth(p))
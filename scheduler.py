@@ -0,0 +1,104 @@
+# scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Runs async callbacks at wall-clock times from a single task driven by a min-heap.
+
+    schedule() is an O(log n) heap push. cancel() is O(1): it only blanks the entry,
+    which the loop skips when it reaches the top. The heap is rebuilt once cancelled
+    entries outnumber live ones, so it never holds much dead weight.
+
+    clock is injectable so tests can drive time by hand and call run_due() directly.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lag = 0.0  # How late the most recent timer fired, in seconds
+        self._heap = []  # [when, seq, key, callback]
+        self._entries = {}  # key -> live heap entry
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def schedule(self, key, when: float, callback):
+        """Run callback() at the given timestamp, replacing any timer with the same key."""
+        self.cancel(key)
+        entry = [when, next(self._seq), key, callback]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wake.set()  # New earliest deadline; let the loop re-arm its sleep
+
+    def cancel(self, key) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[3] = None
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [e for e in self._heap if e[3] is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    async def run_due(self) -> int:
+        """Start every timer whose time has come. Returns how many were started."""
+        now = self.clock()
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            when, _, key, callback = heapq.heappop(self._heap)
+            if callback is None:
+                continue  # Cancelled
+            del self._entries[key]
+            self.lag = now - when
+            fired += 1
+            asyncio.create_task(self._fire(key, callback))
+        return fired
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.run_due()
+            self._wake.clear()
+            # Drop cancelled entries off the top so we sleep until a live deadline
+            while self._heap and self._heap[0][3] is None:
+                heapq.heappop(self._heap)
+            delay = self._heap[0][0] - self.clock() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    async def _fire(key, callback):
+        try:
+            await callback()
+        except Exception:
+            log.exception("Error running scheduled task", extra={"key": key})
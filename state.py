@@ -0,0 +1,54 @@
+# state.py
+"""Live bot state shared by the handlers extension.
+
+Everything that must outlive a reload of handlers.py lives here: open groups, queues,
+timers, caches and the metrics that describe them. handlers.py only holds code, so
+/reload can swap it in place; this module is imported once and never reloaded.
+"""
+import os
+from blizzard_api import CharacterProfiles
+from embed_updates import EmbedCoalescer
+from group_history import GroupHistory
+from group_registry import GuildRegistries
+from guild_config import load_guild_configs
+from metrics import Counter, Gauge, Histogram
+from ping_digest import PingDigest
+from scheduler import Scheduler
+from storage import GroupStore
+
+# Role IDs, emoji and allowed channels per guild
+guild_configs = load_guild_configs(os.getenv('GUILD_CONFIG_PATH', 'guilds.json'))
+
+# Active groups are partitioned by guild, indexed in memory and mirrored to SQLite so they survive restarts
+group_store = GroupStore(os.getenv('GROUPS_DB_PATH', 'groups.db'))
+active_groups = GuildRegistries(group_store)
+
+# Every closed group is appended to the history; /stats reads the running aggregates
+group_history = GroupHistory(os.getenv('GROUP_HISTORY_PATH', 'group_history.bin'))
+
+# At most one embed edit per group message per second, however fast people click
+embed_updates = EmbedCoalescer(window=1.0)
+
+# Characters players linked with /linkchar, and their cached Mythic+ ratings
+character_links = {}  # user ID -> (realm slug, character name), loaded from the group store at startup
+character_profiles = CharacterProfiles(
+    ttl=float(os.getenv('PROFILE_CACHE_SECONDS', '900')),
+    max_size=int(os.getenv('PROFILE_CACHE_SIZE', '5000'))
+)
+
+# In guilds with ping_digest on, role pings go into one refreshed message per channel
+ping_digest = PingDigest(interval=float(os.getenv('PING_DIGEST_SECONDS', '15')), store=group_store)
+
+# Start-time reminders and expiry of groups that never fill, all driven by one task
+timers = Scheduler()
+
+# Players waiting in /queue, per guild; the matcher forms groups from them every tick
+match_queues = {}  # guild ID -> MatchQueue
+match_posts = set()  # Tasks announcing matched groups; they outlive a reload and bot.close() waits for them
+
+Gauge("bot_active_groups", "Groups waiting for players", lambda: len(active_groups))
+Gauge("bot_scheduled_timers", "Pending reminders and expiries", lambda: len(timers))
+Gauge("bot_scheduler_lag_seconds", "How late the most recent timer fired", lambda: timers.lag)
+Gauge("bot_queued_players", "Players waiting in /queue", lambda: sum(len(queue) for queue in match_queues.values()))
+MATCH_TICK_SECONDS = Histogram("bot_match_tick_seconds", "Time spent forming groups from the queue per tick")
+MATCHED_GROUPS = Counter("bot_matched_groups_total", "Groups formed by the matchmaking queue")
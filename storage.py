@@ -0,0 +1,216 @@
+# storage.py
+import asyncio
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from group_registry import Group
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    guild_id INTEGER,
+    dungeon TEXT NOT NULL,
+    key_level INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    created_at TEXT,
+    creator INTEGER NOT NULL,
+    tank INTEGER,
+    healer INTEGER,
+    dps TEXT NOT NULL,
+    names TEXT NOT NULL
+)
+"""
+
+CHARACTERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    user_id INTEGER PRIMARY KEY,
+    realm TEXT NOT NULL,
+    name TEXT NOT NULL
+)
+"""
+
+DIGESTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER,
+    message_id INTEGER NOT NULL,
+    roles TEXT NOT NULL
+)
+"""
+
+log = logging.getLogger(__name__)
+
+UPSERT = """
+INSERT OR REPLACE INTO groups
+    (message_id, channel_id, guild_id, dungeon, key_level, start_time, created_at, creator, tank, healer, dps, names)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class GroupStore:
+    """SQLite-backed copy of the active groups.
+
+    Writes are write-behind: save() and delete() only mark a group dirty, and a
+    background task flushes all dirty groups in one transaction every flush_interval
+    seconds, so button clicks never wait on disk.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn = None
+        self._pending = {}  # message ID -> Group to upsert, or None to delete
+        self._wake = asyncio.Event()
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+    def open(self, default_guild_id: int = None):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # No fsync per commit in WAL mode
+        self._conn.execute(SCHEMA)
+        self._conn.execute(CHARACTERS_SCHEMA)
+        self._conn.execute(DIGESTS_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(groups)")}
+        if "guild_id" not in columns:
+            # Databases from single-guild deployments: assign their groups to that guild
+            self._conn.execute("ALTER TABLE groups ADD COLUMN guild_id INTEGER")
+        if "created_at" not in columns:
+            # Older rows have no creation time; they fall back to their start time
+            self._conn.execute("ALTER TABLE groups ADD COLUMN created_at TEXT")
+        if default_guild_id is not None:
+            self._conn.execute("UPDATE groups SET guild_id = ? WHERE guild_id IS NULL", (default_guild_id,))
+        self._conn.commit()
+
+    def load_all(self) -> list:
+        """Load every stored group in a single query."""
+        rows = self._conn.execute(
+            "SELECT message_id, channel_id, guild_id, dungeon, key_level, start_time, created_at, creator, tank, healer, dps, names FROM groups"
+        ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def load_characters(self) -> dict:
+        """Linked characters as user ID -> (realm slug, character name)."""
+        rows = self._conn.execute("SELECT user_id, realm, name FROM characters").fetchall()
+        return {user_id: (realm, name) for user_id, realm, name in rows}
+
+    async def link_character(self, user_id: int, realm: str, name: str):
+        await self._execute("INSERT OR REPLACE INTO characters (user_id, realm, name) VALUES (?, ?, ?)", (user_id, realm, name))
+
+    async def unlink_character(self, user_id: int):
+        await self._execute("DELETE FROM characters WHERE user_id = ?", (user_id,))
+
+    def load_digests(self) -> dict:
+        """Role-ping digests posted before the last restart, as channel ID -> (guild ID, message ID, roles listed)."""
+        rows = self._conn.execute("SELECT channel_id, guild_id, message_id, roles FROM digests").fetchall()
+        return {channel_id: (guild_id, message_id, frozenset(json.loads(roles))) for channel_id, guild_id, message_id, roles in rows}
+
+    async def save_digest(self, channel_id: int, guild_id: int, message_id: int, roles):
+        await self._execute(
+            "INSERT OR REPLACE INTO digests (channel_id, guild_id, message_id, roles) VALUES (?, ?, ?, ?)",
+            (channel_id, guild_id, message_id, json.dumps(sorted(roles)))
+        )
+
+    async def delete_digest(self, channel_id: int):
+        await self._execute("DELETE FROM digests WHERE channel_id = ?", (channel_id,))
+
+    async def _execute(self, sql: str, params: tuple):
+        # Links change rarely, so write them straight through; the lock keeps the group flusher off the connection
+        async with self._flush_lock:
+            await asyncio.to_thread(self._execute_sync, sql, params)
+
+    def _execute_sync(self, sql, params):
+        with self._conn:
+            self._conn.execute(sql, params)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def save(self, group: Group):
+        self._pending[group.message_id] = group
+        self._wake.set()
+
+    def delete(self, message_id: int):
+        self._pending[message_id] = None
+        self._wake.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            # Serialize on the event loop so the worker thread never sees a group mid-update
+            upserts = [self._to_row(group) for group in batch.values() if group is not None]
+            deletes = [(message_id,) for message_id, group in batch.items() if group is None]
+            try:
+                await asyncio.to_thread(self._write, upserts, deletes)
+            except Exception:
+                log.exception("Error saving groups", extra={"groups": len(batch)})
+                # Put the batch back without clobbering anything newer
+                for message_id, group in batch.items():
+                    self._pending.setdefault(message_id, group)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self.flush()
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            # Give other clicks in the same burst a chance to land in this batch
+            await asyncio.sleep(self.flush_interval)
+            self._wake.clear()
+            await self.flush()
+
+    def _write(self, upserts, deletes):
+        with self._conn:
+            if upserts:
+                self._conn.executemany(UPSERT, upserts)
+            if deletes:
+                self._conn.executemany("DELETE FROM groups WHERE message_id = ?", deletes)
+
+    @staticmethod
+    def _to_row(group: Group) -> tuple:
+        return (
+            group.message_id,
+            group.channel_id,
+            group.guild_id,
+            group.dungeon,
+            group.key_level,
+            group.start_time.isoformat(),
+            group.created_at.isoformat(),
+            group.creator,
+            group.tank,
+            group.healer,
+            json.dumps(group.dps),
+            json.dumps(group.display_names()),
+        )
+
+    @staticmethod
+    def _from_row(row) -> Group:
+        message_id, channel_id, guild_id, dungeon, key_level, start_time, created_at, creator, tank, healer, dps, names = row
+        start_time = datetime.fromisoformat(start_time)
+        group = Group(dungeon, key_level, creator, start_time, message_id=message_id, channel_id=channel_id,
+                      guild_id=guild_id, created_at=datetime.fromisoformat(created_at) if created_at else start_time)
+        group.tank = tank
+        group.healer = healer
+        group.dps = json.loads(dps)
+        group.names = {int(user_id): name for user_id, name in json.loads(names).items()}
+        group.players = set(group.dps)
+        if tank is not None:
+            group.players.add(tank)
+        if healer is not None:
+            group.players.add(healer)
+        return group
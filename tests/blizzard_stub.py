@@ -0,0 +1,57 @@
+# tests/blizzard_stub.py
+"""A local stand-in for the Battle.net OAuth and profile endpoints, served by aiohttp.web."""
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from blizzard_api import BlizzardClient
+
+
+class BlizzardStub:
+    def __init__(self, expires_in=86400):
+        self.expires_in = expires_in
+        self.token_delay = 0.0
+        self.token_failures = 0  # Answer this many token requests with a 500 first
+        self.token_requests = 0
+        self.profiles = {}  # (realm, name) -> rating; characters not listed get a 404
+        self.profile_delay = 0.0
+        self.profile_requests = {}  # (realm, name) -> count
+        self.tokens_seen = []  # Bearer token sent with each profile request
+        app = web.Application()
+        app.router.add_post("/token", self.token)
+        app.router.add_get("/profile/wow/character/{realm}/{name}/mythic-keystone-profile", self.profile)
+        self.server = TestServer(app)
+
+    async def __aenter__(self):
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.close()
+
+    def client(self, **kwargs) -> BlizzardClient:
+        return BlizzardClient("id", "secret", oauth_url=str(self.server.make_url("/token")),
+                              api_url=str(self.server.make_url("")).rstrip("/"), **kwargs)
+
+    async def token(self, request):
+        self.token_requests += 1
+        await asyncio.sleep(self.token_delay)
+        if self.token_failures:
+            self.token_failures -= 1
+            return web.json_response({"error": "server_error"}, status=500)
+        assert request.headers["Authorization"].startswith("Basic ")
+        form = await request.post()
+        assert form["grant_type"] == "client_credentials"
+        return web.json_response({"access_token": f"token-{self.token_requests}", "expires_in": self.expires_in})
+
+    async def profile(self, request):
+        key = (request.match_info["realm"], request.match_info["name"])
+        self.profile_requests[key] = self.profile_requests.get(key, 0) + 1
+        self.tokens_seen.append(request.headers["Authorization"].removeprefix("Bearer "))
+        await asyncio.sleep(self.profile_delay)
+        if key not in self.profiles:
+            return web.json_response({"detail": "Not Found"}, status=404)
+        realm, name = key
+        return web.json_response({
+            "character": {"name": name.capitalize(), "realm": {"name": realm.replace("-", " ").title()}},
+            "current_mythic_rating": {"rating": self.profiles[key]},
+        })
@@ -0,0 +1,11 @@
+# tests/helpers.py
+import asyncio
+import time
+
+
+async def wait_for(condition, timeout=3.0):
+    """Poll condition() until it is true, failing the test after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
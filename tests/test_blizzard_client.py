@@ -0,0 +1,101 @@
+# tests/test_blizzard_client.py
+import asyncio
+import aiohttp
+import pytest
+from blizzard_stub import BlizzardStub
+from helpers import wait_for
+from metrics import BLIZZARD_REQUEST_ERRORS
+
+
+def test_token_is_cached_and_reused():
+    async def main():
+        async with BlizzardStub() as stub:
+            client = stub.client()
+            await client.start()
+            try:
+                await wait_for(lambda: client._token is not None)
+                for _ in range(5):
+                    assert await client.get_access_token() == "token-1"
+                stub.profiles[("area-52", "tank")] = 2500.0
+                for _ in range(3):
+                    await client.get_json("/profile/wow/character/area-52/tank/mythic-keystone-profile")
+                assert stub.token_requests == 1
+                assert stub.tokens_seen == ["token-1"] * 3
+            finally:
+                await client.close()
+
+    asyncio.run(main())
+
+
+def test_concurrent_callers_share_one_token_request():
+    async def main():
+        async with BlizzardStub() as stub:
+            stub.token_delay = 0.05
+            client = stub.client()
+            await client.start()
+            try:
+                tokens = await asyncio.gather(*(client.get_access_token() for _ in range(50)))
+                assert set(tokens) == {"token-1"}
+                assert stub.token_requests == 1
+            finally:
+                await client.close()
+
+    asyncio.run(main())
+
+
+def test_token_is_refreshed_before_it_expires():
+    async def main():
+        # The token goes stale one second after it is minted, long before it actually expires
+        async with BlizzardStub(expires_in=301) as stub:
+            client = stub.client(refresh_margin=300)
+            await client.start()
+            try:
+                await wait_for(lambda: stub.token_requests == 1)
+                await wait_for(lambda: client._token == "token-2")
+                # Callers get the fresh token without waiting on a request of their own
+                assert await client.get_access_token() == "token-2"
+                assert stub.token_requests == 2
+            finally:
+                await client.close()
+
+    asyncio.run(main())
+
+
+def test_failed_refresh_is_shared_and_retried():
+    async def main():
+        async with BlizzardStub() as stub:
+            stub.token_failures = 1
+            stub.token_delay = 0.05
+            client = stub.client()
+            await client.start()  # Opens the session; the refresh loop's own attempt is the one that fails
+            try:
+                errors_before = BLIZZARD_REQUEST_ERRORS.values.get(("oauth/token",), 0)
+                results = await asyncio.gather(*(client.get_access_token() for _ in range(10)), return_exceptions=True)
+                assert stub.token_requests == 1
+                assert all(isinstance(result, aiohttp.ClientResponseError) and result.status == 500 for result in results)
+                assert BLIZZARD_REQUEST_ERRORS.values[("oauth/token",)] == errors_before + 1
+                # The failure is not cached: the next caller starts a new request
+                assert await client.get_access_token() == "token-2"
+                assert stub.token_requests == 2
+            finally:
+                await client.close()
+
+    asyncio.run(main())
+
+
+def test_api_errors_are_raised_and_counted():
+    async def main():
+        async with BlizzardStub() as stub:
+            client = stub.client()
+            await client.start()
+            try:
+                path = "/profile/wow/character/area-52/nobody/mythic-keystone-profile"
+                errors_before = BLIZZARD_REQUEST_ERRORS.values.get(("profile",), 0)
+                with pytest.raises(aiohttp.ClientResponseError) as excinfo:
+                    await client.get_json(path, endpoint="profile")
+                assert excinfo.value.status == 404
+                assert BLIZZARD_REQUEST_ERRORS.values[("profile",)] == errors_before + 1
+            finally:
+                await client.close()
+
+    asyncio.run(main())
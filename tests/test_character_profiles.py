@@ -0,0 +1,135 @@
+# tests/test_character_profiles.py
+import asyncio
+from blizzard_stub import BlizzardStub
+from helpers import wait_for
+from blizzard_api import CharacterProfiles, character_key, realm_slug
+import loadtest  # Its fake Discord objects drive the handlers; importing it also points state at a temp dir
+import state
+
+
+def with_profiles(test, **kwargs):
+    """Run test(stub, profiles) against a stub server with a started client."""
+    async def main():
+        async with BlizzardStub() as stub:
+            client = stub.client()
+            await client.start()
+            try:
+                await test(stub, CharacterProfiles(client, **kwargs))
+            finally:
+                await client.close()
+
+    asyncio.run(main())
+
+
+def test_profiles_expire_and_missing_ones_expire_sooner():
+    async def test(stub, profiles):
+        stub.profiles[("area-52", "tank")] = 2712.4
+        assert (await profiles.get("area-52", "tank"))["rating"] == 2712.4
+        missing = await profiles.get("area-52", "nobody")
+        assert missing == {"name": "Nobody", "realm": "Area 52", "rating": None}
+
+        await profiles.get("area-52", "tank")
+        await profiles.get("area-52", "nobody")
+        assert stub.profile_requests == {("area-52", "tank"): 1, ("area-52", "nobody"): 1}
+
+        await asyncio.sleep(0.25)  # Past missing_ttl, within ttl
+        assert profiles.peek("area-52", "tank") is not None
+        assert profiles.peek("area-52", "nobody") is None
+        stub.profiles[("area-52", "nobody")] = 1850.0  # Their first run
+        assert (await profiles.get("area-52", "nobody"))["rating"] == 1850.0
+
+        await asyncio.sleep(0.3)  # Past ttl
+        assert profiles.peek("area-52", "tank") is None
+        await profiles.get("area-52", "tank")
+        assert stub.profile_requests == {("area-52", "tank"): 2, ("area-52", "nobody"): 2}
+
+    with_profiles(test, ttl=0.5, missing_ttl=0.2)
+
+
+def test_least_recently_used_profile_is_evicted():
+    async def test(stub, profiles):
+        for name in ("a", "b", "c"):
+            stub.profiles[("area-52", name)] = 2000.0
+        await profiles.get("area-52", "a")
+        await profiles.get("area-52", "b")
+        assert profiles.peek("area-52", "a") is not None  # Now the most recently used
+        await profiles.get("area-52", "c")
+        assert len(profiles._cache) == 2
+        assert profiles.peek("area-52", "b") is None
+        assert profiles.peek("area-52", "a") is not None
+        assert profiles.peek("area-52", "c") is not None
+
+    with_profiles(test, max_size=2)
+
+
+def test_groups_showing_the_same_player_share_one_request():
+    async def test(stub, profiles):
+        stub.profile_delay = 0.05
+        stub.profiles[("area-52", "healer")] = 2400.0
+        stub.profiles[("draenor", "dps")] = 2100.0
+        # Ten groups look up their rosters at once; the healer is in all of them
+        rosters = [[("area-52", "healer"), ("draenor", "dps")] if i % 2 else [("area-52", "healer")] for i in range(10)]
+        results = await asyncio.gather(*(profiles.get_many(roster) for roster in rosters))
+        assert all(result[0]["rating"] == 2400.0 for result in results)
+        assert stub.profile_requests == {("area-52", "healer"): 1, ("draenor", "dps"): 1}
+        assert profiles._inflight == {}
+
+    with_profiles(test)
+
+
+def test_realm_and_character_names_are_validated():
+    assert realm_slug(" Area 52 ") == "area-52"
+    assert realm_slug("Quel'Thalas") == "quelthalas"
+    assert realm_slug("Aggra (Português)") == "aggra-portugues"
+    assert character_key(" Zëd ") == "zëd"
+    for realm in ("../../../data/wow/token/index", "area-52/..", "a%2Fb", ""):
+        assert realm_slug(realm) == ""
+    for name in ("../x", "two words", "x/y", ""):
+        assert character_key(name) == ""
+
+
+def test_stored_links_cannot_leave_the_profile_path():
+    async def test(stub, profiles):
+        # A link saved before validation existed
+        profile = await profiles.get("../../../data/wow/token/index", "x")
+        assert profile["rating"] is None
+        assert stub.profile_requests == {("../../../data/wow/token/index", "x"): 1}
+
+    with_profiles(test)
+
+
+def test_click_does_not_wait_for_ratings():
+    async def main():
+        async with BlizzardStub() as stub:
+            stub.profile_delay = 0.3
+            stub.profiles[("area-52", "leader")] = 2650.0
+            stub.profiles[("area-52", "joiner")] = 2310.0
+            client = stub.client()
+            await client.start()
+            store, window = state.active_groups.store, state.embed_updates.window
+            state.active_groups.set_store(None)
+            state.embed_updates.window = 0.05
+            try:
+                harness = loadtest.LoadTest(loadtest.FakeRest())
+                state.character_profiles.client = client  # The cog took the fake bot's client, which is None
+                leader = loadtest.FakeMember(next(loadtest._ids))
+                joiner = loadtest.FakeMember(next(loadtest._ids))
+                state.character_links[leader.id] = ("area-52", "leader")
+                state.character_links[joiner.id] = ("area-52", "joiner")
+
+                message = await harness.startdungeon(leader, harness.channels[0])
+                await harness.click(joiner, message, "dps")
+                # Both handlers answered well before the profile lookups could finish
+                assert max(harness.latencies["startdungeon"] + harness.latencies["button.dps"]) < stub.profile_delay
+                assert "2650" not in str(message.embed.to_dict())
+
+                # Once the ratings arrive the embed is edited in the background
+                await wait_for(lambda: "(2650)" in str(message.embed.to_dict()) and "(2310)" in str(message.embed.to_dict()))
+                assert stub.profile_requests == {("area-52", "leader"): 1, ("area-52", "joiner"): 1}
+            finally:
+                state.character_profiles.client = None
+                state.embed_updates.window = window
+                state.active_groups.set_store(store)
+                await client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+# tests/test_group_concurrency.py
+import asyncio
+import random
+import loadtest  # Its fake Discord objects drive the handlers; importing it also points state at a temp dir
+import state
+from loadtest import FakeMember, FakeRest, LoadTest, _ids
+
+
+def completed_groups() -> int:
+    return sum(totals[0] for guild in state.group_history.stats.guilds.values() for totals in guild["dungeons"].values())
+
+
+def test_concurrent_clicks_never_overfill_or_announce_twice():
+    async def main():
+        rng = random.Random(6)
+        # A little jittered latency on every call so handlers interleave at each await
+        harness = LoadTest(FakeRest(latency=0.002, jitter=0.002, bucket_limit=10**6, seed=6), seed=6)
+        store = state.active_groups.store
+        state.active_groups.set_store(None)
+        try:
+            creators = [FakeMember(next(_ids)) for _ in range(40)]
+            messages = [message for message in await asyncio.gather(*[
+                harness.startdungeon(creator, rng.choice(harness.channels)) for creator in creators
+            ]) if message is not None]
+            groups = {message.id: state.active_groups.guild(1).get(message.id) for message in messages}
+            completed_before = completed_groups()
+
+            pool = [FakeMember(next(_ids)) for _ in range(400)]
+            clicks = []
+            for _ in range(4000):
+                user, message = rng.choice(pool + creators[:5]), rng.choice(messages)
+                if rng.random() < 0.15:
+                    clicks.append(harness.leave(user, message))
+                else:
+                    clicks.append(harness.click(user, message, rng.choice(["tank", "healer", "dps"])))
+            await asyncio.gather(*clicks)
+        finally:
+            state.active_groups.set_store(store)
+
+        full = 0
+        for message_id, group in groups.items():
+            roster = [user for user in (group.tank, group.healer) if user is not None] + group.dps
+            assert len(group.dps) <= 3
+            assert len(roster) == len(set(roster)) and set(roster) == group.players
+            if group.is_full():
+                full += 1
+                assert harness.ready[message_id] == 1, f"group {message_id} was announced {harness.ready[message_id]} times"
+                assert state.active_groups.guild(1).get(message_id) is None
+            else:
+                assert harness.ready[message_id] == 0
+        assert full > 0
+        assert completed_groups() - completed_before == full
+
+    asyncio.run(main())
+
+
+def test_cancel_drops_pending_embed_edit():
+    async def main():
+        harness = LoadTest(FakeRest(bucket_limit=10**6))
+        store, window = state.active_groups.store, state.embed_updates.window
+        state.active_groups.set_store(None)
+        state.embed_updates.window = 0.05
+        try:
+            creator = FakeMember(next(_ids))
+            message = await harness.startdungeon(creator, harness.channels[0])
+            # The first click edits through its response; the second is folded into an edit when the window closes
+            await harness.click(FakeMember(next(_ids)), message, "dps")
+            await harness.click(FakeMember(next(_ids)), message, "dps")
+            await harness.canceldungeon(creator, message)
+            await asyncio.sleep(state.embed_updates.window * 3)
+            assert message.edits == 0
+        finally:
+            state.embed_updates.window = window
+            state.active_groups.set_store(store)
+
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+# tests/test_group_registry.py
+from datetime import datetime
+from group_registry import Group, GroupRegistry
+
+
+def open_group(registry, message_id, creator, role="tank"):
+    group = Group("Darkflame Cleft", 10, creator, datetime.now(), channel_id=1)
+    registry.join(group, creator, role, f"Player{creator}")
+    group.message_id = message_id
+    registry.add(group)
+    return group
+
+
+def test_registered_groups_share_display_names():
+    registry = GroupRegistry()
+    first = open_group(registry, 100, creator=1)
+    second = open_group(registry, 200, creator=2)
+    registry.join(first, 3, "dps", "Player3")
+    registry.join(second, 3, "dps", "Player3")
+    assert first.names is second.names is registry.names
+    assert first.display_names() == {1: "Player1", 3: "Player3"}
+
+    registry.leave(first, 3)
+    assert second.name(3) == "Player3"  # Still in the other group
+    registry.leave(second, 3)
+    assert 3 not in registry.names
+
+    registry.leave(first, 1)
+    assert first.name(1) == "Player1"  # The creator's name stays for the footer
+
+
+def test_removed_group_keeps_its_own_names():
+    registry = GroupRegistry()
+    group = open_group(registry, 100, creator=1)
+    registry.join(group, 2, "healer", "Player2")
+    assert registry.remove(100) is group
+    assert registry.names == {}
+    assert group.names == {1: "Player1", 2: "Player2"}
+    assert group.name(2) == "Player2"
+
+
+def test_lock_and_profiles_are_created_on_first_use():
+    group = Group("Darkflame Cleft", 10, 1, datetime.now())
+    assert group._lock is None and group.profiles is None
+    assert group.profile(1) is None
+    assert group.lock is group.lock
+    group.set_profile(1, "Tank-Area 52 (2500)")
+    assert group.profile(1) == "Tank-Area 52 (2500)"
@@ -0,0 +1,29 @@
+# tests/test_matchmaking.py
+from matchmaking import MatchQueue, QueueEntry
+
+ROLES = ["tank", "healer", "dps", "dps", "dps"]
+
+
+def fill(queue, first_id, queued_at, level=10):
+    for i, role in enumerate(ROLES):
+        queue.add(QueueEntry(first_id + i, f"Player{first_id + i}", role, level, level, queued_at=queued_at + i))
+
+
+def test_restored_players_keep_their_place_in_line():
+    queue = MatchQueue()
+    fill(queue, 0, queued_at=100)
+    [match] = queue.match()
+    assert len(queue) == 0
+
+    fill(queue, 10, queued_at=200)
+    queue.add(QueueEntry(2, "Player2", "dps", 12, 12, queued_at=300))  # Queued again in the meantime
+    restored = queue.restore(match.members)
+    assert [entry.user_id for entry in restored] == [0, 1, 3, 4]
+    assert list(queue.entries) == [0, 1, 3, 4, 10, 11, 12, 13, 14, 2]
+    assert queue.get(2).queued_at == 300
+
+    # The restored players are first in line for the next match
+    [match] = queue.match()
+    assert [entry.user_id for entry in match.members] == [0, 1, 3, 4, 12]
+    assert [entry.user_id for entry in queue.expire(250)] == [10, 11, 13, 14]
+    assert list(queue.entries) == [2]
@@ -0,0 +1,28 @@
+# tests/test_metrics.py
+import logging
+import metrics
+from metrics import DISCORD_GLOBAL_RATE_LIMITS, DISCORD_RATE_LIMITS
+
+
+def test_rate_limits_are_counted_whatever_the_log_level():
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.ERROR)  # As with LOG_LEVEL=ERROR
+    try:
+        metrics.install_discord_hooks()
+        http = logging.getLogger("discord.http")
+        webhook = logging.getLogger("discord.webhook.async_")
+        route = DISCORD_RATE_LIMITS.values.get(("unknown",), 0)
+        global_ = DISCORD_GLOBAL_RATE_LIMITS.values.get((), 0)
+
+        # The templates discord.py logs for a 429; a global one gets both of the first two lines
+        http.warning("We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.", "POST", "/x", 1.0)
+        http.warning("Global rate limit has been hit. Retrying in %.2f seconds.", 1.0)
+        webhook.warning("Webhook ID %s is rate limited. Retrying in %.2f seconds.", 1, 1.0)
+        http.warning(ValueError("not a string"))
+        http.info("POST /x has received 200")
+
+        assert DISCORD_RATE_LIMITS.values[("unknown",)] == route + 2
+        assert DISCORD_GLOBAL_RATE_LIMITS.values[()] == global_ + 1
+    finally:
+        root.setLevel(level)
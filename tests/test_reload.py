@@ -0,0 +1,20 @@
+# tests/test_reload.py
+import asyncio
+import loadtest  # Its fake Discord objects drive the handlers; importing it also points state at a temp dir
+import state
+from loadtest import FakeRest, LoadTest
+
+
+def test_reload_keeps_groups_timers_and_buttons():
+    async def main():
+        harness = LoadTest(FakeRest(bucket_limit=10**6, seed=20), seed=20)
+        state.group_store.open()  # The cog reads saved digests when it loads
+        try:
+            await harness.scenario_reload(groups=25, players=60)
+        finally:
+            await state.timers.close()
+            await state.group_store.close()
+        assert harness.reload_errors == []
+        assert harness.ops["button.dps"] > 0
+
+    asyncio.run(main())
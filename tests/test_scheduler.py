@@ -0,0 +1,141 @@
+# tests/test_scheduler.py
+import asyncio
+import random
+from scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler():
+    clock = FakeClock()
+    return Scheduler(clock=clock), clock
+
+
+async def run_due(scheduler) -> int:
+    fired = await scheduler.run_due()
+    await asyncio.sleep(0)  # Let the callbacks it started run
+    return fired
+
+
+def test_only_live_timers_fire_in_order():
+    async def main():
+        scheduler, clock = make_scheduler()
+        fired = []
+
+        def callback(key):
+            async def run():
+                fired.append(key)
+            return run
+
+        rng = random.Random(7)
+        deadlines = {key: clock.now + rng.uniform(1, 100) for key in range(2000)}
+        for key, when in deadlines.items():
+            scheduler.schedule(key, when, callback(key))
+        cancelled = set(rng.sample(sorted(deadlines), 1500))
+        for key in cancelled:
+            assert scheduler.cancel(key)
+        assert not scheduler.cancel(next(iter(cancelled)))  # Already gone
+        # Rescheduling replaces the old timer instead of adding a second one
+        moved = next(key for key in deadlines if key not in cancelled)
+        deadlines[moved] = clock.now + 200
+        scheduler.schedule(moved, deadlines[moved], callback(moved))
+
+        live = sorted((key for key in deadlines if key not in cancelled), key=deadlines.get)
+        assert len(scheduler) == len(live)
+
+        clock.now += 50
+        await run_due(scheduler)
+        assert fired == [key for key in live if deadlines[key] <= clock.now]
+
+        clock.now += 1000
+        await run_due(scheduler)
+        assert fired == live
+        assert len(scheduler) == 0
+        assert await run_due(scheduler) == 0
+
+    asyncio.run(main())
+
+
+def test_nothing_fires_early():
+    async def main():
+        scheduler, clock = make_scheduler()
+        fired = []
+
+        async def callback():
+            fired.append(clock.now)
+
+        scheduler.schedule("a", clock.now + 10, callback)
+        clock.now += 9.999
+        assert await run_due(scheduler) == 0
+        clock.now += 0.001
+        assert await run_due(scheduler) == 1
+        assert fired == [clock.now]
+
+    asyncio.run(main())
+
+
+def test_heap_is_compacted_when_mostly_cancelled():
+    async def main():
+        scheduler, clock = make_scheduler()
+
+        async def callback():
+            pass
+
+        for key in range(1000):
+            scheduler.schedule(key, clock.now + key + 1, callback)
+        for key in range(900):
+            scheduler.cancel(key)
+        # Cancelled entries may linger, but never outnumber live ones by more than 2:1
+        assert len(scheduler) == 100
+        assert len(scheduler._heap) <= max(64, 2 * len(scheduler))
+        dead = sum(1 for entry in scheduler._heap if entry[3] is None)
+        assert dead <= len(scheduler)
+        # The survivors still fire in order once the dead entries are gone
+        clock.now += 2000
+        assert await run_due(scheduler) == 100
+        assert scheduler._heap == []
+
+    asyncio.run(main())
+
+
+def test_lag_records_how_late_the_last_timer_fired():
+    async def main():
+        scheduler, clock = make_scheduler()
+
+        async def callback():
+            pass
+
+        scheduler.schedule("early", clock.now + 5, callback)
+        scheduler.schedule("late", clock.now + 8, callback)
+        clock.now += 10
+        assert await run_due(scheduler) == 2
+        assert scheduler.lag == 2.0  # The most recent one, "late", was 2s overdue
+
+    asyncio.run(main())
+
+
+def test_failing_callback_does_not_stop_others():
+    async def main():
+        scheduler, clock = make_scheduler()
+        fired = []
+
+        async def boom():
+            raise RuntimeError("boom")
+
+        async def ok():
+            fired.append("ok")
+
+        scheduler.schedule("boom", clock.now + 1, boom)
+        scheduler.schedule("ok", clock.now + 2, ok)
+        clock.now += 5
+        await run_due(scheduler)
+        await asyncio.sleep(0)
+        assert fired == ["ok"]
+
+    asyncio.run(main())